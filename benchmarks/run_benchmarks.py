@@ -0,0 +1,384 @@
+'''
+Benchmarks of the package functions on reproducible synthetic graphs.
+
+Every function of degree_dist, hierarchy, graph_randomisation and neighborhood is timed,
+with every direction mode it supports, on directed Erdos-Renyi, Barabasi-Albert
+and scale-free tree graphs of several sizes. The wall time and the peak memory
+(tracemalloc) of every case is written to a JSON file, two such files can be compared.
+
+Usage:
+-------
+python benchmarks/run_benchmarks.py run --sizes 1000 10000 100000 1000000 --output base.json
+python benchmarks/run_benchmarks.py run --graphs er --filter hierarchy. --output new.json
+python benchmarks/run_benchmarks.py compare base.json new.json --threshold 0.2
+
+The compare mode exits with 1 if any case got slower (or used more memory)
+by more than the threshold, so it can guard an upgrade.
+'''
+import argparse
+import datetime
+import functools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),os.pardir))
+
+import degree_dist as dd
+import graph_randomisation as gr
+import hierarchy as hry
+import neighborhood as nb
+from csr_graph import CSRGraph
+
+
+DIRECTIONS = (None,'in','out')
+NO_DIRECTION = ('n/a',) # the function has no direction parameter
+MEAN_DEGREE = 5
+NR_SEEDS = 8
+
+
+# graphs:
+
+def erdos_renyi(nr_edges,seed=0):
+    '''
+    Directed G(n,m) random graph, with MEAN_DEGREE out-edges per node on average.
+    '''
+    nr_nodes = max(nr_edges//MEAN_DEGREE,2)
+    return nx.gnm_random_graph(nr_nodes,nr_edges,directed=True,seed=seed)
+
+
+def barabasi_albert(nr_edges,seed=0):
+    '''
+    Barabasi-Albert graph, every edge points from the newer node to the older one (like citations).
+    '''
+    nr_nodes = nr_edges//MEAN_DEGREE+MEAN_DEGREE
+    undirected = nx.barabasi_albert_graph(nr_nodes,MEAN_DEGREE,seed=seed)
+    graph = nx.DiGraph()
+    graph.add_nodes_from(undirected)
+    graph.add_edges_from((max(u,v),min(u,v)) for u,v in undirected.edges())
+    return graph
+
+
+def scale_free_tree(nr_edges,seed=0):
+    '''
+    Directed tree grown by preferential attachment: every new node points to one older node,
+    chosen with probability proportional to its in-degree + 1.
+    '''
+    rng = np.random.default_rng(seed)
+    targets = [0] # every node once, and once more for every in-edge
+    graph = nx.DiGraph()
+    graph.add_node(0)
+    for node,r in enumerate(rng.random(nr_edges).tolist(),start=1):
+        target = targets[int(r*len(targets))]
+        graph.add_edge(node,target)
+        targets.append(node)
+        targets.append(target)
+    return graph
+
+
+GRAPHS = {'er':erdos_renyi,'ba':barabasi_albert,'tree':scale_free_tree}
+
+
+class Workload:
+    '''
+    A benchmark graph and the inputs derived from it, computed once and only when a case needs them.
+    '''
+    def __init__(self,kind,nr_edges,input_format='networkx',seed=0):
+        self.kind = kind
+        self.nr_edges = nr_edges
+        self.input_format = input_format
+        self.seed = seed
+        self.nx_graph = GRAPHS[kind](nr_edges,seed=seed)
+        self.graph = CSRGraph.from_networkx(self.nx_graph) if input_format == 'csr' else self.nx_graph
+
+        rng = np.random.default_rng(seed)
+        nodes = list(self.nx_graph.nodes())
+        self.seeds = [nodes[i] for i in rng.choice(len(nodes),min(NR_SEEDS,len(nodes)),replace=False)]
+        self._cache = {}
+        self._tmpdir = None
+
+    def cached(self,name,func):
+        if name not in self._cache:
+            self._cache[name] = func()
+        return self._cache[name]
+
+    @property
+    def undirected(self):
+        def build():
+            graph = nx.Graph(self.nx_graph)
+            return CSRGraph.from_networkx(graph) if self.input_format == 'csr' else graph
+        return self.cached('undirected',build)
+
+    def degrees(self,direction):
+        return self.cached(('degrees',direction),lambda: dd.degree_array(self.graph,direction))
+
+    def LRCs(self,direction=None):
+        return self.cached(('LRCs',direction),
+                           lambda: hry.m_reaching_centrality(self.graph,m=2,direction=direction,method='bitset'))
+
+    @property
+    def sweep(self):
+        return self.cached('sweep',lambda: hry.hierarchy_lvls_sweep(self.LRCs(),[0.25,0.5,1]))
+
+    @property
+    def components(self):
+        return self.cached('components',lambda: nb.env_of_nodes_first_order(self.nx_graph,self.seeds)[0])
+
+    @property
+    def edgelist(self):
+        def write():
+            self._tmpdir = tempfile.TemporaryDirectory()
+            path = os.path.join(self._tmpdir.name,'edges.txt')
+            np.savetxt(path,np.array(list(self.nx_graph.edges()),dtype=np.int64).reshape(-1,2),fmt='%d')
+            return path
+        return self.cached('edgelist',write)
+
+    def close(self):
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+
+
+# cases: name, function of (workload, direction), directions, largest number of edges (None: no limit)
+
+def _each_seed(func):
+    def run(w,d):
+        return [func(w,d,seed) for seed in w.seeds]
+    return run
+
+
+def _tracker_update(w,d):
+    tracker = hry.LRCTracker(w.graph,m=2,direction=d)
+    edges = list(tracker.graph.edges())[:10]
+    tracker.remove_edges(edges)
+    tracker.add_edges(edges)
+    return tracker.grc()
+
+
+CASES = [
+    # degree_dist
+    ('degree_dist.degree_array',lambda w,d: dd.degree_array(w.graph,d),DIRECTIONS,None),
+    ('degree_dist.degree_dist',lambda w,d: dd.degree_dist(w.graph,d),DIRECTIONS,None),
+    ('degree_dist.cum_degree_dist',lambda w,d: dd.cum_degree_dist(w.graph,d),DIRECTIONS,None),
+    ('degree_dist.degree_dist_logbinned',lambda w,d: dd.degree_dist_logbinned(w.graph,direction=d),DIRECTIONS,None),
+    ('degree_dist.degree_dist_from_degrees',lambda w,d: dd.degree_dist_from_degrees(w.degrees(d)),DIRECTIONS,None),
+    ('degree_dist.cum_degree_dist_from_degrees',lambda w,d: dd.cum_degree_dist_from_degrees(w.degrees(d)),DIRECTIONS,None),
+    ('degree_dist.degree_dist_logbinned_from_degrees',lambda w,d: dd.degree_dist_logbinned_from_degrees(w.degrees(d)),DIRECTIONS,None),
+    ('degree_dist.edgelist_degree_arrays',lambda w,d: dd.edgelist_degree_arrays(w.edgelist),NO_DIRECTION,None),
+    ('degree_dist.edgelist_degree_dist',lambda w,d: dd.edgelist_degree_dist(w.edgelist,direction=d),DIRECTIONS,None),
+    ('degree_dist.degree_correlation[networkx]',lambda w,d: dd.degree_correlation(w.graph,d,method='networkx'),DIRECTIONS,100000),
+    ('degree_dist.degree_correlation[sparse]',lambda w,d: dd.degree_correlation(w.graph,d,method='sparse'),DIRECTIONS,None),
+    ('degree_dist.degree_correlation_exponent',
+     lambda w,d: dd.degree_correlation_exponent(w.cached(('knn',d),lambda: dd.degree_correlation(w.graph,d,method='sparse'))),
+     DIRECTIONS,None),
+
+    # hierarchy
+    ('hierarchy.m_reaching_centrality[bfs,m=None]',lambda w,d: hry.m_reaching_centrality(w.graph,None,d,method='bfs'),DIRECTIONS,10000),
+    ('hierarchy.m_reaching_centrality[bfs,m=2]',lambda w,d: hry.m_reaching_centrality(w.graph,2,d,method='bfs'),DIRECTIONS,100000),
+    ('hierarchy.m_reaching_centrality[bitset,m=None]',lambda w,d: hry.m_reaching_centrality(w.graph,None,d,method='bitset'),DIRECTIONS,100000),
+    ('hierarchy.m_reaching_centrality[bitset,m=2]',lambda w,d: hry.m_reaching_centrality(w.graph,2,d,method='bitset'),DIRECTIONS,None),
+    ('hierarchy.m_reaching_centrality[condensation]',lambda w,d: hry.m_reaching_centrality(w.graph,None,d,method='condensation'),DIRECTIONS,None),
+    ('hierarchy.global_reaching_centrality[bfs,m=2]',lambda w,d: hry.global_reaching_centrality(w.graph,2,d),DIRECTIONS,100000),
+    ('hierarchy.global_reaching_centrality[auto,m=None]',lambda w,d: hry.global_reaching_centrality(w.graph,None,d,method='auto'),DIRECTIONS,None),
+    ('hierarchy.approximate_global_reaching_centrality',
+     lambda w,d: hry.approximate_global_reaching_centrality(w.graph,None,d,target_error=0.05,seed=0),DIRECTIONS,None),
+    ('hierarchy.LRCTracker.update',_tracker_update,DIRECTIONS,100000),
+    ('hierarchy.hierarchy_lvls_of_node_LRCs',lambda w,d: hry.hierarchy_lvls_of_node_LRCs(w.LRCs(),1),NO_DIRECTION,None),
+    ('hierarchy.hierarchy_lvls_of_many_node_LRCs',lambda w,d: hry.hierarchy_lvls_of_many_node_LRCs([w.LRCs(),w.LRCs('in')],[0.5,1]),NO_DIRECTION,None),
+    ('hierarchy.hierarchy_lvls_sweep',lambda w,d: hry.hierarchy_lvls_sweep(w.LRCs(),[0.25,0.5,1]),NO_DIRECTION,None),
+    ('hierarchy.lvls_of_sweep',lambda w,d: hry.lvls_of_sweep(w.sweep,0.5),NO_DIRECTION,None),
+    ('hierarchy.get_coordinates_of_lvls_avgLRCs',lambda w,d: hry.get_coordinates_of_lvls_avgLRCs(w.sweep,STD_coef=0.5),NO_DIRECTION,None),
+
+    # graph_randomisation
+    ('graph_randomisation.degree_preserving_randomisation',
+     lambda w,d: gr.degree_preserving_randomisation(w.undirected,100),NO_DIRECTION,100000),
+    ('graph_randomisation.degree_preserving_randomisation_fast[undirected]',
+     lambda w,d: gr.degree_preserving_randomisation_fast(w.undirected,w.nr_edges,seed=0),NO_DIRECTION,None),
+    ('graph_randomisation.degree_preserving_randomisation_fast[directed]',
+     lambda w,d: gr.degree_preserving_randomisation_fast(w.graph,w.nr_edges,seed=0),NO_DIRECTION,None),
+    ('graph_randomisation.randomised_ensemble',
+     lambda w,d: list(gr.randomised_ensemble(w.graph,2,w.nr_edges//10,{'degrees':functools.partial(dd.degree_array,direction='out')},seed=0)),
+     NO_DIRECTION,None),
+
+    # neighborhood
+    ('neighborhood.neighbors_at_n_step',_each_seed(lambda w,d,s: nb.neighbors_at_n_step(w.graph,s,2,d)),DIRECTIONS,None),
+    ('neighborhood.neighbors_within_n_step',_each_seed(lambda w,d,s: nb.neighbors_within_n_step(w.graph,s,2,d)),DIRECTIONS,None),
+    ('neighborhood.subgraph_within_n_step',_each_seed(lambda w,d,s: nb.subgraph_within_n_step(w.graph,s,2,d)),DIRECTIONS,None),
+    ('neighborhood.subgraphs_of_nodes_within_n_steps',lambda w,d: nb.subgraphs_of_nodes_within_n_steps(w.graph,w.seeds,2,d),DIRECTIONS,None),
+    ('neighborhood.subgraphs_around_nodes_within_cutoff',lambda w,d: nb.subgraphs_around_nodes_within_cutoff(w.graph,w.seeds,2,d),DIRECTIONS,None),
+    ('neighborhood.ego_networks',lambda w,d: nb.ego_networks(w.graph,w.seeds,2,d),DIRECTIONS,None),
+    ('neighborhood.neighbors_first_order',_each_seed(lambda w,d,s: nb.neighbors_first_order(w.graph,s,d)),DIRECTIONS,None),
+    ('neighborhood.env_of_nodes_first_order',lambda w,d: nb.env_of_nodes_first_order(w.graph,w.seeds),NO_DIRECTION,None),
+    ('neighborhood.nr_components_linked_by_element',
+     _each_seed(lambda w,d,s: nb.nr_components_linked_by_element(w.nx_graph,s,w.components)),NO_DIRECTION,None),
+]
+
+
+# measurement:
+
+def measure(func,repeat=3,max_seconds=60.0):
+    '''
+    Wall times of repeat calls (fewer, if one call takes more than max_seconds),
+    and the peak memory of one more call, traced by tracemalloc.
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter()-start)
+        if times[-1] > max_seconds:
+            break
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return times,peak
+
+
+def run(args):
+    results = []
+    too_slow = set() # (case, graph, input, direction) that reached max_seconds at a smaller size
+
+    for kind in args.graphs:
+        for input_format in args.inputs:
+            for nr_edges in sorted(args.sizes):
+                start = time.perf_counter()
+                workload = Workload(kind,nr_edges,input_format=input_format,seed=args.seed)
+                print('# %s %s %d edges, built in %.1f s'%(kind,input_format,nr_edges,time.perf_counter()-start),flush=True)
+
+                for name,func,directions,max_edges in CASES:
+                    if args.filter and not any(f in name for f in args.filter):
+                        continue
+                    for direction in directions:
+                        record = {'case':name,'graph':kind,'input':input_format,'nr_edges':nr_edges,
+                                  'nr_nodes':workload.nx_graph.number_of_nodes(),'direction':direction}
+                        key = (name,kind,input_format,direction)
+
+                        if max_edges is not None and nr_edges > max_edges:
+                            record['skipped'] = 'larger than %d edges'%max_edges
+                        elif key in too_slow:
+                            record['skipped'] = 'slower than %g s on a smaller graph'%args.max_seconds
+                        else:
+                            np.random.seed(args.seed)
+                            try:
+                                times,peak = measure(functools.partial(func,workload,direction),
+                                                     repeat=args.repeat,max_seconds=args.max_seconds)
+                            except Exception as error:
+                                record['error'] = '%s: %s'%(type(error).__name__,error)
+                            else:
+                                record.update({'seconds':min(times),'median_seconds':statistics.median(times),
+                                               'times':times,'peak_memory':peak})
+                                if max(times) > args.max_seconds:
+                                    too_slow.add(key)
+
+                        results.append(record)
+                        print(_format_record(record),flush=True)
+
+                workload.close()
+
+    output = {'meta':_meta(args),'results':results}
+    with open(args.output,'w') as f:
+        json.dump(output,f,indent=1)
+    print('Results written to %s'%args.output)
+
+    return 0
+
+
+def _meta(args):
+    return {'date':datetime.datetime.now().isoformat(timespec='seconds'),
+            'python':platform.python_version(),
+            'platform':platform.platform(),
+            'cpu_count':os.cpu_count(),
+            'numpy':np.__version__,
+            'networkx':nx.__version__,
+            'arguments':{k:v for k,v in vars(args).items() if k != 'command'}}
+
+
+def _format_record(record):
+    label = '%-70s %-5s %-8s %8d %-4s'%(record['case'],record['graph'],record['input'],record['nr_edges'],record['direction'])
+    if 'seconds' in record:
+        return '%s %10.4f s %10.1f MB'%(label,record['seconds'],record['peak_memory']/2**20)
+    return '%s %s'%(label,record.get('skipped') or record.get('error'))
+
+
+# comparison:
+
+def _record_key(record):
+    return (record['case'],record['graph'],record['input'],record['nr_edges'],str(record['direction']))
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = {_record_key(r):r for r in json.load(f)['results']}
+    with open(args.new) as f:
+        new = {_record_key(r):r for r in json.load(f)['results']}
+
+    regressions = 0
+    for key in sorted(set(base) & set(new),key=str):
+        old_record,new_record = base[key],new[key]
+        if 'seconds' not in old_record or 'seconds' not in new_record:
+            if 'seconds' in old_record and 'error' in new_record:
+                print('ERROR       %s: %s'%(' '.join(map(str,key)),new_record['error']))
+                regressions += 1
+            continue
+
+        time_ratio = new_record['seconds']/max(old_record['seconds'],1e-12)
+        memory_ratio = new_record['peak_memory']/max(old_record['peak_memory'],1)
+
+        slower = time_ratio > 1+args.threshold and new_record['seconds'] > args.min_seconds
+        larger = memory_ratio > 1+args.threshold and new_record['peak_memory'] > args.min_memory
+        flag = 'REGRESSION' if slower or larger else ('faster' if time_ratio < 1/(1+args.threshold) else '')
+        regressions += slower or larger
+
+        if flag or args.verbose:
+            print('%-11s %s  time x%.2f (%.4f -> %.4f s)  memory x%.2f'%(flag,' '.join(map(str,key)),time_ratio,
+                  old_record['seconds'],new_record['seconds'],memory_ratio))
+
+    missing = set(base)-set(new)
+    if missing:
+        print('%d cases of the base run are missing from the new run.'%len(missing))
+    print('%d regressions.'%regressions)
+
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command',required=True)
+
+    run_parser = commands.add_parser('run',help='run the benchmarks')
+    run_parser.add_argument('--graphs',nargs='+',choices=sorted(GRAPHS),default=['er','ba','tree'])
+    run_parser.add_argument('--sizes',nargs='+',type=int,default=[1000,10000,100000,1000000],help='numbers of edges')
+    run_parser.add_argument('--inputs',nargs='+',choices=['networkx','csr'],default=['networkx'],help='graph objects passed to the functions')
+    run_parser.add_argument('--filter',nargs='+',help='run only the cases containing one of these strings')
+    run_parser.add_argument('--repeat',type=int,default=3)
+    run_parser.add_argument('--max-seconds',type=float,default=60.0,
+                            help='a case slower than this is not repeated, and skipped on the larger graphs')
+    run_parser.add_argument('--seed',type=int,default=0)
+    run_parser.add_argument('--output',default='benchmark_results.json')
+
+    compare_parser = commands.add_parser('compare',help='compare two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold',type=float,default=0.2,help='relative slowdown (or memory growth) flagged')
+    compare_parser.add_argument('--min-seconds',type=float,default=0.005,help='faster cases are not flagged')
+    compare_parser.add_argument('--min-memory',type=int,default=2**20,help='smaller peak memory (bytes) is not flagged')
+    compare_parser.add_argument('--verbose',action='store_true',help='print every case, not only the changed ones')
+
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
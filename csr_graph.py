@@ -0,0 +1,659 @@
+'''
+Compressed sparse row (CSR) adjacency of networkx graphs and traversals on it.
+The array based backends of degree_dist, hierarchy and neighborhood are built on these functions.
+'''
+import json
+import os
+import numpy as np
+import networkx as nx
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from instrumentation import current_monitor
+
+
+def _opposite(direction):
+    return {'in':'out','out':'in'}.get(direction)
+
+
+class CSRGraph:
+    '''
+    Compact, immutable graph: the edges are int32 node index arrays,
+    the node names are in a list (the index of a node is its position).
+    The CSR adjacencies of the "out", "in" and undirected (None) directions
+    and the degree arrays are built when they are first needed, and cached.
+    
+    Every public function of the package accepts it in place of a networkx graph,
+    so the conversion is paid once, not in every function call.
+    The node and edge attributes of the networkx graph are not kept.
+    
+    Parameters:
+    ----------
+    nodes : list of node names.
+    
+    src, dst : arrays of the source and target node indices of the edges.
+    
+    directed : bool
+    
+    multigraph : bool, if True the parallel edges are kept in the edge arrays (the adjacencies merge them).
+    
+    Example:
+    -------
+    CG = CSRGraph.from_networkx(G)
+    hierarchy.global_reaching_centrality(CG,m=2,direction='in',method='bitset')
+    '''
+    def __init__(self,nodes,src,dst,directed=True,multigraph=False):
+        self.nodes = list(nodes)
+        # read-only views, the arrays of the caller stay writeable:
+        self.src = np.ascontiguousarray(src,dtype=np.int32).view()
+        self.dst = np.ascontiguousarray(dst,dtype=np.int32).view()
+        self.src.flags.writeable = False
+        self.dst.flags.writeable = False
+        self.directed = directed
+        self.multigraph = multigraph
+        self._index = None
+        self._adjacency = {}
+        self._degrees = {}
+        self._fingerprint = None
+    
+    @classmethod
+    def from_networkx(cls,graph):
+        nodes,src,dst = edge_arrays(graph)
+        return cls(nodes,src,dst,directed=graph.is_directed(),multigraph=graph.is_multigraph())
+    
+    def __len__(self):
+        return len(self.nodes)
+    
+    def __contains__(self,node):
+        return node in self.index
+    
+    def __iter__(self):
+        return iter(self.nodes)
+    
+    @property
+    def index(self):
+        '''
+        Dict of node names to node indices.
+        '''
+        if self._index is None:
+            self._index = {n:i for i,n in enumerate(self.nodes)}
+        return self._index
+    
+    def is_directed(self):
+        return self.directed
+    
+    def is_multigraph(self):
+        return self.multigraph
+    
+    def number_of_nodes(self):
+        return len(self.nodes)
+    
+    def number_of_edges(self):
+        return len(self.src)
+    
+    def adjacency(self,direction=None):
+        '''
+        The cached CSR adjacency (indptr, indices) of the direction, see csr_adjacency.
+        '''
+        if not self.directed:
+            direction = None
+        if direction not in self._adjacency:
+            if direction == None:
+                src,dst = np.concatenate((self.src,self.dst)),np.concatenate((self.dst,self.src))
+            elif direction == 'in':
+                src,dst = self.dst,self.src
+            elif direction == 'out':
+                src,dst = self.src,self.dst
+            else:
+                print('Direction format is not correct.')
+            indptr,indices = csr_from_edges(src,dst,len(self.nodes))
+            indptr.flags.writeable = False
+            indices.flags.writeable = False
+            self._adjacency[direction] = (indptr,indices)
+        
+        return self._adjacency[direction]
+    
+    def degrees(self,direction=None):
+        '''
+        The cached degree array of the direction, the parallel edges are counted, like in networkx.
+        An undirected graph has the same degrees in every direction.
+        '''
+        if not self.directed:
+            direction = None
+        if direction not in self._degrees:
+            nr_nodes = len(self.nodes)
+            if direction == None:
+                degrees = np.bincount(self.src,minlength=nr_nodes) + np.bincount(self.dst,minlength=nr_nodes)
+            elif direction == 'in':
+                degrees = np.bincount(self.dst,minlength=nr_nodes)
+            elif direction == 'out':
+                degrees = np.bincount(self.src,minlength=nr_nodes)
+            else:
+                print('Direction format is not correct.')
+            degrees = degrees.astype(np.int64)
+            degrees.flags.writeable = False
+            self._degrees[direction] = degrees
+        
+        return self._degrees[direction]
+    
+    def neighbors(self,node,direction='out'):
+        '''
+        List of the neighbors of node, by default the targets of its out-edges, like networkx.
+        '''
+        indptr,indices = self.adjacency(direction)
+        i = self.index[node]
+        return [self.nodes[j] for j in indices[indptr[i]:indptr[i+1]].tolist()]
+    
+    def _networkx_class(self,directed):
+        if self.multigraph:
+            return nx.MultiDiGraph if directed else nx.MultiGraph
+        return nx.DiGraph if directed else nx.Graph
+    
+    def subgraph(self,nodes,directed=None):
+        '''
+        The induced subgraph of the nodes, as a new networkx graph.
+        If directed is False, the subgraph of a directed graph is undirected.
+        '''
+        directed = self.directed if directed == None else directed and self.directed
+        mask = np.zeros(len(self.nodes),dtype=bool)
+        mask[[self.index[n] for n in nodes]] = True
+        edge_mask = mask[self.src] & mask[self.dst]
+        
+        subgraph = self._networkx_class(directed)()
+        subgraph.add_nodes_from(self.nodes[i] for i in np.flatnonzero(mask).tolist())
+        subgraph.add_edges_from(zip([self.nodes[i] for i in self.src[edge_mask].tolist()],
+                                    [self.nodes[i] for i in self.dst[edge_mask].tolist()]))
+        return subgraph
+    
+    def to_networkx(self):
+        '''
+        A new networkx graph with the nodes and edges.
+        '''
+        graph = self._networkx_class(self.directed)()
+        graph.add_nodes_from(self.nodes)
+        graph.add_edges_from(zip([self.nodes[i] for i in self.src.tolist()],[self.nodes[i] for i in self.dst.tolist()]))
+        return graph
+
+
+_VIEW_FILES = {'out':'out','in':'in',None:'undirected'}
+
+
+def save_csr_graph(graph,path):
+    '''
+    Writes the graph in a directory of numpy files, which can be memory-mapped by load_csr_graph:
+    the edge arrays (src.npy, dst.npy), the CSR adjacencies of every direction
+    (indptr_out.npy, indices_out.npy, ...), the node names (nodes.npy) and meta.json.
+    
+    Parameters:
+    ----------
+    graph: networkx object or CSRGraph
+    
+    path: path of the directory, it's created if it doesn't exist.
+    '''
+    if not isinstance(graph,CSRGraph):
+        graph = CSRGraph.from_networkx(graph)
+    os.makedirs(path,exist_ok=True)
+    
+    if all(isinstance(n,(int,np.integer)) and not isinstance(n,bool) for n in graph.nodes):
+        label_type,labels = 'int',np.array(graph.nodes,dtype=np.int64)
+    elif all(isinstance(n,str) for n in graph.nodes):
+        label_type,labels = 'str',np.array(graph.nodes,dtype=str)
+    else:
+        label_type,labels = 'object',np.empty(len(graph.nodes),dtype=object)
+        labels[:] = graph.nodes
+    
+    np.save(os.path.join(path,'nodes.npy'),labels,allow_pickle=label_type == 'object')
+    np.save(os.path.join(path,'src.npy'),graph.src)
+    np.save(os.path.join(path,'dst.npy'),graph.dst)
+    
+    directions = ['out','in',None] if graph.is_directed() else [None]
+    for direction in directions:
+        indptr,indices = graph.adjacency(direction)
+        np.save(os.path.join(path,'indptr_%s.npy' % _VIEW_FILES[direction]),indptr)
+        np.save(os.path.join(path,'indices_%s.npy' % _VIEW_FILES[direction]),indices)
+    
+    with open(os.path.join(path,'meta.json'),'w') as f:
+        json.dump({'directed':graph.is_directed(),
+                   'multigraph':graph.is_multigraph(),
+                   'nr_nodes':graph.number_of_nodes(),
+                   'nr_edges':graph.number_of_edges(),
+                   'label_type':label_type},f)
+
+
+def load_csr_graph(path,mmap_mode='r'):
+    '''
+    Reads a graph written by save_csr_graph. The arrays are memory-mapped, so the loading is
+    almost instant and the processes reading the same files share one page-cached copy.
+    (In a process pool, pass the path to the workers and load the graph there.)
+    Only the node names are read into memory.
+    
+    Parameters:
+    ----------
+    path: path of the directory.
+    
+    mmap_mode: mode of np.load, None reads the arrays into memory.
+    
+    Returns:
+    -------
+    CSRGraph
+    '''
+    with open(os.path.join(path,'meta.json')) as f:
+        meta = json.load(f)
+    
+    labels = np.load(os.path.join(path,'nodes.npy'),allow_pickle=meta['label_type'] == 'object')
+    src = np.load(os.path.join(path,'src.npy'),mmap_mode=mmap_mode)
+    dst = np.load(os.path.join(path,'dst.npy'),mmap_mode=mmap_mode)
+    
+    graph = CSRGraph(labels.tolist(),src,dst,directed=meta['directed'],multigraph=meta['multigraph'])
+    
+    directions = ['out','in',None] if meta['directed'] else [None]
+    for direction in directions:
+        graph._adjacency[direction] = (np.load(os.path.join(path,'indptr_%s.npy' % _VIEW_FILES[direction]),mmap_mode=mmap_mode),
+                                       np.load(os.path.join(path,'indices_%s.npy' % _VIEW_FILES[direction]),mmap_mode=mmap_mode))
+    
+    return graph
+
+
+def edge_arrays(graph):
+    '''
+    Returns the nodes of the graph and the source, target node indices of its edges.
+    The edges are in the order of graph.edges(), parallel edges are listed separately.
+    
+    Parameters:
+    ----------
+    graph: networkx object or CSRGraph
+    
+    Returns:
+    -------
+    nodes : list of node names, the index of a node is its position.
+    
+    src, dst : numpy int64 arrays of source and target node indices.
+               For a CSRGraph its read-only int32 arrays are returned without a copy
+               (they can be memory-mapped), widen them before arithmetic which could overflow.
+    '''
+    if isinstance(graph,CSRGraph):
+        return graph.nodes,graph.src,graph.dst
+    
+    nodes = list(graph.nodes())
+    index = {n:i for i,n in enumerate(nodes)}
+    nr_edges = graph.number_of_edges()
+    
+    src = np.fromiter((index[u] for u,v in graph.edges()),dtype=np.int64,count=nr_edges)
+    dst = np.fromiter((index[v] for u,v in graph.edges()),dtype=np.int64,count=nr_edges)
+    
+    return nodes,src,dst
+
+
+def csr_from_edges(src,dst,nr_nodes):
+    '''
+    Returns the CSR adjacency (indptr, indices) of the edges, parallel edges are merged.
+    The neighbors of node i are indices[indptr[i]:indptr[i+1]], in increasing order.
+    '''
+    keys = np.unique(np.asarray(src,dtype=np.int64)*nr_nodes + np.asarray(dst,dtype=np.int64))
+    
+    indptr = np.zeros(nr_nodes+1,dtype=np.int64)
+    np.cumsum(np.bincount(keys//nr_nodes,minlength=nr_nodes),out=indptr[1:])
+    indices = (keys % nr_nodes).astype(np.int32)
+    
+    return indptr,indices
+
+
+def csr_adjacency(graph,direction=None):
+    '''
+    Returns the CSR adjacency of the graph in the given direction.
+    
+    Parameters:
+    ----------
+    graph: networkx object or CSRGraph (its cached adjacency is returned)
+    
+    direction: (None|"in"|"out") The neighbors of a node are the targets of its out-edges ("out"),
+               the sources of its in-edges ("in"), or both of them (None).
+               For undirected graphs every direction gives the same neighbors.
+    
+    Returns:
+    -------
+    nodes : list of node names, the index of a node is its position.
+    
+    indptr, indices : CSR arrays, the neighbors of node i are indices[indptr[i]:indptr[i+1]].
+    '''
+    if isinstance(graph,CSRGraph):
+        return (graph.nodes,)+graph.adjacency(direction)
+    
+    nodes,src,dst = edge_arrays(graph)
+    
+    if not graph.is_directed() or direction == None:
+        src,dst = np.concatenate((src,dst)),np.concatenate((dst,src))
+    elif direction == 'in':
+        src,dst = dst,src
+    elif direction != 'out':
+        print('Direction format is not correct.')
+    
+    indptr,indices = csr_from_edges(src,dst,len(nodes))
+    
+    return nodes,indptr,indices
+
+
+def bfs_lengths(graph,node,cutoff=None,direction=None):
+    '''
+    Hop distances from node within cutoff on the CSR adjacency of the direction,
+    like nx.single_source_shortest_path_length (the nodes are in BFS order).
+    
+    Returns:
+    -------
+    Dict of node names and distances.
+    '''
+    nodes,indptr,indices = csr_adjacency(graph,direction=direction)
+    index = graph.index if isinstance(graph,CSRGraph) else {n:i for i,n in enumerate(nodes)}
+    
+    source = index[node]
+    lengths = {source:0}
+    frontier = [source]
+    level = 0
+    while frontier and (cutoff == None or level < cutoff):
+        level += 1
+        next_frontier = []
+        for u in frontier:
+            for v in indices[indptr[u]:indptr[u+1]].tolist():
+                if v not in lengths:
+                    lengths[v] = level
+                    next_frontier.append(v)
+        frontier = next_frontier
+    
+    return {nodes[i]:length for i,length in lengths.items()}
+
+
+def _propagate(frontier,out_csr,in_csr):
+    '''
+    One level of the bit-parallel BFS: a node gets the bits of its in-neighbors in the frontier.
+    The frontier is pushed through the out-edges of its nodes if they are few,
+    otherwise every node pulls the frontier bits of its in-neighbors.
+    '''
+    out_indptr,out_indices = out_csr
+    in_indptr,in_indices = in_csr
+    nr_nodes,nr_words = frontier.shape
+    reached = np.zeros_like(frontier)
+    
+    active = np.flatnonzero(np.bitwise_or.reduce(frontier,axis=1))
+    out_degrees = out_indptr[active+1]-out_indptr[active]
+    nr_active_edges = int(out_degrees.sum())
+    if nr_active_edges == 0:
+        return reached
+    
+    monitor = current_monitor()
+    if monitor.enabled:
+        monitor.count('edges scanned',nr_active_edges if nr_active_edges*8 < len(out_indices) else len(in_indices))
+    
+    if nr_active_edges*8 < len(out_indices):
+        # push:
+        edge_ids = np.repeat(out_indptr[active]-np.cumsum(out_degrees)+out_degrees,out_degrees) + np.arange(nr_active_edges)
+        sources = np.repeat(active,out_degrees)
+        targets = out_indices[edge_ids]
+        order = np.argsort(targets,kind='stable')
+        targets = targets[order]
+        bits = frontier[sources[order]]
+        starts = np.flatnonzero(np.r_[True,targets[1:]!=targets[:-1]])
+        reached[targets[starts]] = np.bitwise_or.reduceat(bits,starts,axis=0)
+    else:
+        # pull:
+        rows = np.flatnonzero(np.diff(in_indptr))
+        reached[rows] = np.bitwise_or.reduceat(frontier[in_indices],in_indptr[rows],axis=0)
+    
+    return reached
+
+
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)],dtype=np.uint8)
+
+
+def _popcount_rows(bits):
+    '''
+    Number of set bits in every row of a uint64 array.
+    '''
+    if hasattr(np,'bitwise_count'):
+        return np.bitwise_count(bits).sum(axis=1,dtype=np.int64)
+    return _BYTE_POPCOUNT[bits.view(np.uint8)].sum(axis=1,dtype=np.int64)
+
+
+def _bit_counts(bits,nr_sources,chunk=65536):
+    '''
+    Number of nodes having the bit of each source.
+    '''
+    counts = np.zeros(bits.shape[1]*64,dtype=np.int64)
+    for i in range(0,len(bits),chunk):
+        unpacked = np.unpackbits(bits[i:i+chunk].astype('<u8').view(np.uint8),axis=1,bitorder='little')
+        counts += unpacked.sum(axis=0,dtype=np.int64)
+    
+    return counts[:nr_sources]
+
+
+def multi_source_bfs(out_csr,in_csr,sources,cutoff=None,batch_size=512):
+    '''
+    Bit-parallel multi-source BFS (MS-BFS). The sources are traversed in batches of batch_size,
+    every source of a batch is one bit of the 64 bit words of a node, so one level
+    of the traversal is done for all the sources of the batch together.
+    
+    Parameters:
+    ----------
+    out_csr : (indptr, indices), the CSR adjacency of the traversal direction.
+    
+    in_csr : (indptr, indices), the CSR adjacency of the opposite direction.
+    
+    sources : array of node indices.
+    
+    cutoff : None, int, or array of the maximal distance for every source.
+    
+    batch_size : number of sources traversed together, multiple of 64.
+    
+    Returns:
+    -------
+    generator of (batch_sources, visited) pairs, visited is a (nr_nodes, batch_size/64) uint64 array,
+    bit j of the row of a node is set if the node is within cutoff from the j-th source of the batch.
+    '''
+    sources = np.asarray(sources,dtype=np.int64)
+    nr_nodes = len(out_csr[0])-1
+    nr_words = max(1,-(-batch_size//64))
+    
+    cutoffs = np.full(len(sources),np.inf) if cutoff is None else np.broadcast_to(np.asarray(cutoff,dtype=float),len(sources))
+    per_source = cutoff is not None and np.ndim(cutoff) > 0
+    monitor = current_monitor()
+    
+    for start in range(0,len(sources),nr_words*64):
+        batch_sources = sources[start:start+nr_words*64]
+        batch_cutoffs = cutoffs[start:start+nr_words*64]
+        positions = np.arange(len(batch_sources))
+        bits = np.left_shift(np.uint64(1),(positions%64).astype(np.uint64))
+        
+        visited = np.zeros((nr_nodes,nr_words),dtype=np.uint64)
+        np.bitwise_or.at(visited,(batch_sources,positions//64),bits)
+        frontier = visited.copy()
+        
+        level = 0
+        while level < batch_cutoffs.max():
+            frontier = _propagate(frontier,out_csr,in_csr)
+            frontier &= ~visited
+            if per_source:
+                # only the sources with larger cutoff go on:
+                mask = np.zeros(nr_words,dtype=np.uint64)
+                going_on = batch_cutoffs > level
+                np.bitwise_or.at(mask,positions[going_on]//64,bits[going_on])
+                frontier &= mask
+            if not np.bitwise_or.reduce(frontier,axis=None):
+                break
+            visited |= frontier
+            level += 1
+        
+        if monitor.enabled:
+            monitor.count('bfs levels',level)
+            monitor.progress('bfs sources',start+len(batch_sources),len(sources))
+        yield batch_sources,visited
+
+
+def multi_source_bfs_levels(out_csr,in_csr,sources,cutoff=None,batch_size=512):
+    '''
+    Level-synchronous variant of multi_source_bfs: the nodes reached at each level are yielded
+    separately, so the rings around the sources (the nodes at exactly k steps) come from one traversal.
+    The parameters are the same as in multi_source_bfs, but cutoff is None or an int.
+    
+    Returns:
+    -------
+    generator of (batch_sources, level, ring) triples, level goes from 0 (the sources) to cutoff,
+    or until no new node is reached. ring is a (nr_nodes, batch_size/64) uint64 array,
+    bit j of the row of a node is set if the node is exactly level steps from the j-th source of the batch.
+    '''
+    sources = np.asarray(sources,dtype=np.int64)
+    nr_nodes = len(out_csr[0])-1
+    nr_words = max(1,-(-batch_size//64))
+    monitor = current_monitor()
+    
+    for start in range(0,len(sources),nr_words*64):
+        batch_sources = sources[start:start+nr_words*64]
+        positions = np.arange(len(batch_sources))
+        
+        visited = np.zeros((nr_nodes,nr_words),dtype=np.uint64)
+        np.bitwise_or.at(visited,(batch_sources,positions//64),np.left_shift(np.uint64(1),(positions%64).astype(np.uint64)))
+        frontier = visited.copy()
+        yield batch_sources,0,frontier
+        
+        level = 0
+        while cutoff is None or level < cutoff:
+            frontier = _propagate(frontier,out_csr,in_csr)
+            frontier &= ~visited
+            if not np.bitwise_or.reduce(frontier,axis=None):
+                break
+            visited |= frontier
+            level += 1
+            yield batch_sources,level,frontier
+        
+        if monitor.enabled:
+            monitor.count('bfs levels',level)
+            monitor.progress('bfs sources',start+len(batch_sources),len(sources))
+
+
+def visited_pairs(visited,nr_sources):
+    '''
+    The (source position, node index) pairs of the set bits of a visited array of multi_source_bfs,
+    ordered by source position, then by node index.
+    '''
+    rows,words = np.nonzero(visited)
+    unpacked = np.unpackbits(visited[rows,words].astype('<u8').view(np.uint8).reshape(-1,8),axis=1,bitorder='little')
+    pair_ids,bit_ids = np.nonzero(unpacked)
+    positions = words[pair_ids]*64 + bit_ids
+    nodes = rows[pair_ids]
+    
+    order = np.lexsort((nodes,positions))
+    positions,nodes = positions[order],nodes[order]
+    valid = positions < nr_sources
+    
+    return positions[valid],nodes[valid]
+
+
+def reach_counts(out_csr,in_csr,sources,cutoff=None,batch_size=512):
+    '''
+    Number of nodes within cutoff distance from each of the sources, the source itself is counted too.
+    The parameters are the same as in multi_source_bfs.
+    
+    Returns:
+    -------
+    counts : numpy int64 array, in the order of sources.
+    '''
+    counts = []
+    for batch_sources,visited in multi_source_bfs(out_csr,in_csr,sources,cutoff=cutoff,batch_size=batch_size):
+        counts.append(_bit_counts(visited,len(batch_sources)))
+    
+    return np.concatenate(counts) if counts else np.zeros(0,dtype=np.int64)
+
+
+def _topological_levels(indptr,indices):
+    '''
+    Levels of a DAG from its CSR adjacency: the sinks are on level 0,
+    the other nodes are one level above their highest successor.
+    
+    Returns:
+    -------
+    list of arrays of node indices, one array for every level, from level 0.
+    '''
+    nr_nodes = len(indptr)-1
+    out_degrees = np.diff(indptr)
+    sources = np.repeat(np.arange(nr_nodes),out_degrees)
+    
+    # predecessors in CSR:
+    order = np.argsort(indices,kind='stable')
+    pred_indptr = np.zeros(nr_nodes+1,dtype=np.int64)
+    np.cumsum(np.bincount(indices,minlength=nr_nodes),out=pred_indptr[1:])
+    pred_indices = sources[order]
+    
+    remaining = out_degrees.copy()
+    current = np.flatnonzero(remaining == 0)
+    levels = []
+    while len(current):
+        levels.append(current)
+        degrees = pred_indptr[current+1]-pred_indptr[current]
+        edge_ids = np.repeat(pred_indptr[current]-np.cumsum(degrees)+degrees,degrees) + np.arange(int(degrees.sum()))
+        preds = pred_indices[edge_ids]
+        np.subtract.at(remaining,preds,1)
+        preds = np.unique(preds)
+        current = preds[remaining[preds] == 0]
+    
+    return levels
+
+
+def condensation_reach_counts(out_csr,batch_size=4096):
+    '''
+    Number of nodes reachable from every node without cutoff, the node itself is counted too.
+    The nodes of a strongly connected component (SCC) reach the same nodes,
+    so the reachable sets are propagated through the DAG of the SCCs,
+    from the sinks to the sources, as bitsets of batch_size components at once.
+    
+    Parameters:
+    ----------
+    out_csr : (indptr, indices), the CSR adjacency of the traversal direction.
+    
+    batch_size : number of target components in one bitset batch, multiple of 64.
+    
+    Returns:
+    -------
+    counts : numpy int64 array, for every node.
+    '''
+    indptr,indices = out_csr
+    nr_nodes = len(indptr)-1
+    
+    adjacency = sp.csr_matrix((np.ones(len(indices),dtype=np.int8),indices,indptr),shape=(nr_nodes,nr_nodes))
+    nr_comps,labels = connected_components(adjacency,directed=True,connection='strong')
+    sizes = np.bincount(labels,minlength=nr_comps)
+    
+    # edges of the condensation DAG:
+    sources = labels[np.repeat(np.arange(nr_nodes),np.diff(indptr))]
+    targets = labels[indices]
+    between = sources != targets
+    dag_indptr,dag_indices = csr_from_edges(sources[between],targets[between],nr_comps)
+    
+    levels = _topological_levels(dag_indptr,dag_indices)
+    
+    nr_words = max(1,-(-batch_size//64))
+    comp_counts = np.zeros(nr_comps,dtype=np.int64)
+    
+    for start in range(0,nr_comps,nr_words*64):
+        targets_in_batch = np.arange(start,min(start+nr_words*64,nr_comps))
+        positions = targets_in_batch-start
+        
+        reach = np.zeros((nr_comps,nr_words),dtype=np.uint64)
+        reach[targets_in_batch,positions//64] = np.left_shift(np.uint64(1),(positions%64).astype(np.uint64))
+        
+        for comps in levels[1:]:
+            degrees = dag_indptr[comps+1]-dag_indptr[comps]
+            edge_ids = np.repeat(dag_indptr[comps]-np.cumsum(degrees)+degrees,degrees) + np.arange(int(degrees.sum()))
+            starts = np.cumsum(degrees)-degrees
+            reach[comps] |= np.bitwise_or.reduceat(reach[dag_indices[edge_ids]],starts,axis=0)
+        
+        # the reached nodes are the sum of the sizes of the reached components:
+        comp_counts += _popcount_rows(reach)
+        big = positions[sizes[targets_in_batch] > 1] # the components with more nodes are added again
+        if len(big):
+            rows = np.flatnonzero(np.bitwise_or.reduce(reach,axis=1))
+            extra_sizes = np.zeros(nr_words*64)
+            extra_sizes[big] = sizes[big+start]-1
+            chunk = max(1,2**22//(nr_words*64))
+            for i in range(0,len(rows),chunk):
+                unpacked = np.unpackbits(reach[rows[i:i+chunk]].astype('<u8').view(np.uint8),axis=1,bitorder='little')
+                comp_counts[rows[i:i+chunk]] += np.rint(unpacked.astype(np.float64) @ extra_sizes).astype(np.int64)
+    
+    return comp_counts[labels]
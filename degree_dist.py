@@ -1,15 +1,254 @@
-from collections import Counter
-from collections import OrderedDict
+import gzip
+import itertools
 import numpy as np
 import networkx as nx
+import scipy.sparse as sp
 import math as math
 
-def degree_dist(graph,direction=None):
+from csr_graph import CSRGraph, edge_arrays, csr_from_edges
+
+def degree_array(graph,direction=None):
+    ''' Return the degrees of the nodes of graph as a numpy array, in the order of graph.nodes().
+
+        Parameters
+        ----------
+        graph : networkx object or CSRGraph
+        
+        direction: None or string (in, out), see degree_dist.
+        
+        Returns
+        -------
+        degrees : numpy int64 array.
+    '''
+    if isinstance(graph,CSRGraph):
+        return graph.degrees(direction)
+    
+    if direction == None:
+        degrees = graph.degree()
+    elif direction == 'out':
+        degrees = graph.out_degree()
+    elif direction == 'in':
+        degrees = graph.in_degree()
+    else:
+        print('Direction format is not correct.')
+    
+    return np.fromiter((d for n,d in degrees),dtype=np.int64,count=graph.number_of_nodes())
+
+
+def degree_dist_from_degrees(degrees,as_dict=True):
+    ''' Return the degree distribution of a degree array, see degree_dist.
+        The occurrences are counted with np.bincount, so it's O(N + k_max).
+        
+        Parameters
+        ----------
+        degrees : array of the degrees of the nodes.
+        
+        as_dict : bool, if False the arrays of degrees and probabilities are returned.
+        
+        Returns
+        -------
+        degdist : dictionary, keys are degree, values are the possibilities of a given degree.
+        
+        or if as_dict is False:
+        
+        k_vals, p_probs : numpy arrays of the degrees (in increasing order) and their probabilities.
+    '''
+    counts = np.bincount(np.asarray(degrees,dtype=np.int64))
+    k_vals = np.flatnonzero(counts)
+    p_probs = counts[k_vals]/len(degrees)
+    
+    if as_dict:
+        return dict(zip(k_vals.tolist(),p_probs.tolist()))
+    return k_vals,p_probs
+
+
+def cum_degree_dist_from_degrees(degrees,as_dict=True):
+    ''' Return the cumulative degree distribution of a degree array, see cum_degree_dist.
+        
+        Parameters
+        ----------
+        degrees : array of the degrees of the nodes.
+        
+        as_dict : bool, if False the arrays of degrees and cumulative probabilities are returned.
+    '''
+    k_vals,p_probs = degree_dist_from_degrees(degrees,as_dict=False)
+    cum_probs = 1-np.cumsum(p_probs)
+    
+    if as_dict:
+        return dict(zip(k_vals.tolist(),cum_probs.tolist()))
+    return k_vals,cum_probs
+
+
+def degree_dist_logbinned_from_degrees(degrees,base=2,as_dict=True):
+    ''' Return the degree distribution of a degree array with logarithmic binning, see degree_dist_logbinned.
+        Only the distinct degree values are visited, they are binned with np.digitize
+        and the bins are summed with np.bincount.
+        
+        Parameters
+        ----------
+        degrees : array of the degrees of the nodes.
+        
+        base : the base of exponentialy growing bin sizes, must be integer
+        
+        as_dict : bool, if False the arrays of bin degrees and probabilities are returned.
+    '''
+    k_vals,p_probs = degree_dist_from_degrees(degrees,as_dict=False)
+    
+    nr_bins = int(math.log(k_vals[-1],base))+1
+    edges = np.array([base**i for i in range(nr_bins+1)]) # the i-th bin is [base**i,base**(i+1))
+    bin_ids = np.digitize(k_vals,edges)-1
+    # the zero degree is not in any bin, and like in the original loop the bins end at base**nr_bins
+    # (math.log can round an exact power of base down, then the largest degree is left out):
+    in_bins = (bin_ids >= 0) & (bin_ids < nr_bins)
+    bin_ids,k_vals,p_probs = bin_ids[in_bins],k_vals[in_bins],p_probs[in_bins]
+    
+    counts = np.bincount(bin_ids,minlength=nr_bins)
+    k_sums = np.bincount(bin_ids,weights=k_vals,minlength=nr_bins)
+    k_vals_log = np.full(nr_bins,np.nan) # the empty bins have no average degree
+    np.divide(k_sums,counts,out=k_vals_log,where=counts > 0)
+    k_probs_log = np.bincount(bin_ids,weights=p_probs,minlength=nr_bins)/np.diff(edges)
+    
+    if as_dict:
+        return dict(zip(k_vals_log.tolist(),k_probs_log.tolist()))
+    return k_vals_log,k_probs_log
+
+
+def _open_edgelist(path,binary=False):
+    '''
+    Open the edge list file, gzipped files (.gz) are decompressed on the fly.
+    '''
+    mode = 'rb' if binary else 'rt'
+    if str(path).endswith('.gz'):
+        return gzip.open(path,mode)
+    return open(path,mode)
+
+
+def _edgelist_chunks(path,binary=False,dtype=np.int64,delimiter=None,comments='#',chunk_size=1000000):
+    '''
+    Yields the (source, target) columns of the edge list in chunks of chunk_size edges.
+    A text line contains the source and target node ids, the further columns (e.g. weights) are skipped.
+    A binary file contains the source, target pairs as raw integers of dtype.
+    '''
+    with _open_edgelist(path,binary=binary) as f:
+        if binary:
+            nr_bytes = 2*chunk_size*np.dtype(dtype).itemsize
+            while True:
+                data = f.read(nr_bytes)
+                if not data:
+                    break
+                pairs = np.frombuffer(data,dtype=dtype).reshape(-1,2)
+                yield pairs[:,0],pairs[:,1]
+            return
+        
+        nr_lines = 0
+        while True:
+            lines = list(itertools.islice(f,chunk_size))
+            if not lines:
+                break
+            fields = []
+            for line in lines:
+                if not line.strip() or line.startswith(comments):
+                    continue
+                if delimiter != None:
+                    line = line.replace(delimiter,' ')
+                pair = line.split(None,2)[:2]
+                if len(pair) < 2:
+                    raise ValueError('Edge list line with less than 2 columns: %r'%line)
+                fields += pair
+            if not fields: # only comments or blank lines in this chunk
+                nr_lines += len(lines)
+                continue
+            try:
+                pairs = np.fromstring(' '.join(fields),dtype=np.int64,sep=' ')
+            except ValueError:
+                raise ValueError('Edge list with non-integer node ids in the lines %d-%d.'%(nr_lines+1,nr_lines+len(lines)))
+            pairs = pairs.reshape(-1,2)
+            nr_lines += len(lines)
+            yield pairs[:,0],pairs[:,1]
+
+
+def edgelist_degree_arrays(path,nr_nodes=None,binary=False,dtype=np.int64,delimiter=None,comments='#',chunk_size=1000000):
+    ''' Return the in-, out- and total degree of the nodes of an edge list file, without building a graph.
+        The file is read in one pass, in chunks, only the degree counters are kept in memory.
+        
+        The node ids must be integers from 0 to nr_nodes-1. Every line (pair) is counted as an edge,
+        the parallel edges are not merged like in a networkx graph.
+        
+        Parameters
+        ----------
+        path : path of the edge list file, text or binary, it can be gzipped (.gz).
+        
+        nr_nodes : number of nodes, if None the largest node id + 1.
+        
+        binary : bool, if True the file contains source, target pairs as raw integers of dtype.
+        
+        dtype : numpy dtype of the binary file.
+        
+        delimiter : the separator of the columns of a text file, the default is whitespace.
+        
+        comments : the lines starting with it are skipped.
+        
+        chunk_size : number of edges read at once.
+        
+        Returns
+        -------
+        degrees : dict of numpy arrays, keys are "in", "out" and None (the total degree, like the direction parameter).
+    '''
+    size = nr_nodes if nr_nodes != None else 0
+    in_degrees = np.zeros(size,dtype=np.int64)
+    out_degrees = np.zeros(size,dtype=np.int64)
+    
+    for src,dst in _edgelist_chunks(path,binary=binary,dtype=dtype,delimiter=delimiter,comments=comments,chunk_size=chunk_size):
+        max_id = int(max(src.max(),dst.max()))
+        if max_id >= len(in_degrees):
+            if nr_nodes != None:
+                raise ValueError('Node id %d is out of range of nr_nodes.' % max_id)
+            in_degrees = np.concatenate((in_degrees,np.zeros(max_id+1-len(in_degrees),dtype=np.int64)))
+            out_degrees = np.concatenate((out_degrees,np.zeros(max_id+1-len(out_degrees),dtype=np.int64)))
+        out_degrees += np.bincount(src,minlength=len(out_degrees))
+        in_degrees += np.bincount(dst,minlength=len(in_degrees))
+    
+    return {'in':in_degrees,'out':out_degrees,None:in_degrees+out_degrees}
+
+
+def edgelist_degree_dist(path,direction=None,kind='dist',base=2,as_dict=True,**reading_options):
+    ''' Return the degree distribution of an edge list file, without building a graph.
+        The results are the same as degree_dist, cum_degree_dist or degree_dist_logbinned on the graph of the edge list,
+        if the node ids are 0..N-1 and there are no parallel edges.
+        For more distributions of the same file, use edgelist_degree_arrays once and the *_from_degrees functions.
+        
+        Parameters
+        ----------
+        path : path of the edge list file, see edgelist_degree_arrays.
+        
+        direction: None or string (in, out), see degree_dist.
+        
+        kind : "dist" (degree_dist), "cum" (cum_degree_dist) or "logbinned" (degree_dist_logbinned).
+        
+        base : the base of exponentialy growing bin sizes, only for "logbinned".
+        
+        as_dict : bool, if False arrays are returned.
+        
+        reading_options : nr_nodes, binary, dtype, delimiter, comments, chunk_size of edgelist_degree_arrays.
+    '''
+    degrees = edgelist_degree_arrays(path,**reading_options)[direction]
+    
+    if kind == 'dist':
+        return degree_dist_from_degrees(degrees,as_dict=as_dict)
+    elif kind == 'cum':
+        return cum_degree_dist_from_degrees(degrees,as_dict=as_dict)
+    elif kind == 'logbinned':
+        return degree_dist_logbinned_from_degrees(degrees,base=base,as_dict=as_dict)
+    else:
+        print('Kind format is not correct.')
+
+
+def degree_dist(graph,direction=None,as_dict=True):
     ''' Return the degree distribution of graph.
 
         Parameters
         ----------
-        graph : networkx object
+        graph : networkx object or CSRGraph
         
         direction: None or string (in, out)
         
@@ -20,32 +259,26 @@ def degree_dist(graph,direction=None):
         
         If direction = out : We use the number of outgoing degrees, as degree.
         
+        as_dict : bool, if False the arrays of degrees and probabilities are returned.
+        
         Returns
         -------
         degdist : dictionary, keys are degree, values are the possibilities of a given degree.
+        
+        or if as_dict is False:
+        
+        k_vals, p_probs : numpy arrays of the degrees (in increasing order) and their probabilities.
             
     '''
-    nr_nodes=graph.number_of_nodes()
-    
-    if direction == None:
-        degdist = Counter(sorted([d for n,d in graph.degree()],reverse=False))
-    elif direction == 'out':
-        degdist = Counter(sorted([d for n,d in graph.out_degree()],reverse=False))
-    elif direction == 'in':
-        degdist = Counter(sorted([d for n,d in graph.in_degree()],reverse=False))
-    else:
-        print('Direction format is not correct.')
-    
-    degdist = {k: v / nr_nodes  for k, v in degdist.items()}
-    return degdist
+    return degree_dist_from_degrees(degree_array(graph,direction),as_dict=as_dict)
     
 
-def cum_degree_dist(graph,direction=None):
+def cum_degree_dist(graph,direction=None,as_dict=True):
     ''' Return the cumulative degree distribution of graph. 
         At k value, the probability = 1-P(K < k)
         Parameters
         ----------
-        graph : networkx object
+        graph : networkx object or CSRGraph
         
         direction: None or string
         
@@ -55,37 +288,23 @@ def cum_degree_dist(graph,direction=None):
         
         If direction = out : We use the number of outgoing degrees, as degree.
         
+        as_dict : bool, if False the arrays of degrees and cumulative probabilities are returned.
+        
         Returns
         -------
         degdist : dictionary, degree as key, cumulative probabilities of a given degree as values.
             
     '''
-    
-    degdist = degree_dist(graph,direction)
-    #sorted by degree values
-    degdist = OrderedDict(sorted(degdist.items()))
-    
-    k_vals = list(degdist.keys())
-    p_probs = list(degdist.values())
-    
-    cum_probs = []
-    sub_list = []
-    
-    for i in range(len(k_vals)):
-        sub_list.clear()
-        sub_list = [x for x in p_probs[:i+1]]
-        cum_probs.append(1-sum(sub_list))
-    
-    return dict(zip(k_vals,cum_probs))
+    return cum_degree_dist_from_degrees(degree_array(graph,direction),as_dict=as_dict)
 
 
-def degree_dist_logbinned(graph,base=2,direction=None):
+def degree_dist_logbinned(graph,base=2,direction=None,as_dict=True):
     ''' Return the degree distribution of graph with logarithmic binning. 
         The logartihmic binning could solve the issue of the non-equeal sampling.
         
         Parameters
         ----------
-        graph : networkx object
+        graph : networkx object or CSRGraph
         
         base : the base of exponentialy growing bin sizes, must be integer
         
@@ -96,39 +315,18 @@ def degree_dist_logbinned(graph,base=2,direction=None):
             If direction = in : We use the number of incoming degrees, as degree.
 
             If direction = out : We use the number of outgoing degrees, as degree.
+        
+        as_dict : bool, if False the arrays of bin degrees and probabilities are returned.
 
         Returns
         -------
         degdist : dictionary, degree as key, cumulative probabilities of a given degree as values.
             
     '''
-    degdist = degree_dist(graph,direction)
-    degdist = OrderedDict(sorted(degdist.items()))#sorted by degree values:
-
-    
-    boundarys=[[base**(i-1),base**i] for i in range(1,int(math.log(max(degdist.keys()),base))+2)]
-    
-    k_vals_log=[]
-    k_probs_log=[]
-    
-    for i in range(len(boundarys)):
-        s=0 #for sum node probabilities in a bin
-        tmp_degrees=[]
-        tmp_degrees.clear()
-        
-        for j in range(boundarys[i][0],boundarys[i][1]):
-            if j in degdist.keys():
-                s+=degdist[j]
-                tmp_degrees.append(j)
-        k_vals_log.append(np.average(tmp_degrees))
-        k_probs_log.append(s/(boundarys[i][1]-boundarys[i][0]))
-
-    
-    return dict(zip(k_vals_log,k_probs_log))
-    
+    return degree_dist_logbinned_from_degrees(degree_array(graph,direction),base=base,as_dict=as_dict)
     
 
-def degree_correlation(graph,direction=None):
+def degree_correlation(graph,direction=None,method='networkx',return_exponent=False):
     '''
     Degree correlation function, with the degree values.
     
@@ -137,7 +335,7 @@ def degree_correlation(graph,direction=None):
     
     Parameters
     ----------
-    graph : networkx object
+    graph : networkx object or CSRGraph
 
     direction: None or string("in"|"out")
 
@@ -146,15 +344,114 @@ def degree_correlation(graph,direction=None):
                         degree of a node is the in-degree.
     If direction = out : The node's neighbours are at the end of out-degree and 
                         degree of a node is the out-degree.
-
+    
+    method: ("networkx"|"sparse") "networkx" uses nx.average_neighbor_degree.
+            "sparse" computes the neighbour degree sums as a sparse matrix-vector product,
+            and groups them by degree with np.bincount, without copying the graph.
+            A CSRGraph always uses the "sparse" method.
+    
+    return_exponent: bool, if True the fitted correlation exponent is returned too,
+                     see degree_correlation_exponent.
     
     
     Return:
     ------
     k_nn: dict(k,k_nn)
+    
+    mu: the correlation exponent, only if return_exponent is True.
+    '''
+    if method == 'sparse' or isinstance(graph,CSRGraph):
+        k_nn = _sparse_degree_correlation(graph,direction=direction)
+    else:
+        k_nn = _networkx_degree_correlation(graph,direction=direction)
+    
+    if return_exponent:
+        return k_nn,degree_correlation_exponent(k_nn)
+    return k_nn
+
+
+def degree_correlation_exponent(k_nn):
+    '''
+    The correlation exponent mu of the k_nn(k) ~ k^mu power law,
+    fitted with least squares on the log-log scale. Positive mu means assortative,
+    negative mu means disassortative network.
+    
+    Parameters
+    ----------
+    k_nn: dict(k,k_nn), the result of degree_correlation.
+    
+    Return:
+    ------
+    mu: float, nan if there are less than two points with positive k and k_nn.
     '''
+    k_vals = np.array(list(k_nn.keys()),dtype=float)
+    knn_vals = np.array(list(k_nn.values()),dtype=float)
+    valid = (k_vals > 0) & (knn_vals > 0)
     
+    if valid.sum() < 2:
+        return np.nan
     
+    return np.polyfit(np.log(k_vals[valid]),np.log(knn_vals[valid]),1)[0]
+
+
+def _sparse_degree_correlation(graph,direction=None):
+    '''
+    degree_correlation with a SciPy CSR adjacency: the average degree of the neighbours
+    of every node is one matrix-vector product, the k_nn(k) averages are np.bincount sums.
+    The neighbours are counted once (like in nx.average_neighbor_degree),
+    the degrees are counted with the parallel edges.
+    '''
+    nodes,src,dst = edge_arrays(graph)
+    nr_nodes = len(nodes)
+    if not graph.is_directed(): # the orientation of the stored undirected edges doesn't matter
+        direction = None
+    
+    if direction == None:
+        if graph.is_directed():
+            # the degree in the undirected copy of the graph: a pair of opposite edges is one edge
+            keys,counts = np.unique(src.astype(np.int64)*nr_nodes + dst,return_counts=True)
+            pairs,pair_ids = np.unique(np.minimum(keys//nr_nodes,keys%nr_nodes)*nr_nodes + np.maximum(keys//nr_nodes,keys%nr_nodes),return_inverse=True)
+            multiplicity = np.zeros(len(pairs),dtype=np.int64)
+            np.maximum.at(multiplicity,pair_ids,counts)
+            u,v = pairs//nr_nodes,pairs%nr_nodes
+            source_degrees = np.bincount(u,weights=multiplicity,minlength=nr_nodes) + np.bincount(v,weights=multiplicity,minlength=nr_nodes)
+        else:
+            source_degrees = np.bincount(src,minlength=nr_nodes) + np.bincount(dst,minlength=nr_nodes)
+        source_degrees = source_degrees.astype(np.int64)
+        target_degrees = source_degrees
+        indptr,indices = csr_from_edges(np.concatenate((src,dst)),np.concatenate((dst,src)),nr_nodes)
+        total_degrees = np.bincount(src,minlength=nr_nodes) + np.bincount(dst,minlength=nr_nodes)
+    elif direction == 'in':
+        source_degrees = target_degrees = total_degrees = np.bincount(dst,minlength=nr_nodes)
+        indptr,indices = csr_from_edges(dst,src,nr_nodes)
+    elif direction == 'out':
+        source_degrees = target_degrees = total_degrees = np.bincount(src,minlength=nr_nodes)
+        indptr,indices = csr_from_edges(src,dst,nr_nodes)
+    else:
+        print('Direction format is not correct.')
+    
+    adjacency = sp.csr_matrix((np.ones(len(indices)),indices,indptr),shape=(nr_nodes,nr_nodes))
+    neighbour_degree_sums = adjacency @ target_degrees.astype(np.float64)
+    avg_neighboursdeg = np.divide(neighbour_degree_sums,source_degrees,out=np.zeros(nr_nodes),where=source_degrees!=0)
+    
+    # k_nn sums by the degree of the nodes, divided by the number of nodes with the degree:
+    k_sums = np.bincount(source_degrees,weights=avg_neighboursdeg)
+    k_vals,p_probs = degree_dist_from_degrees(total_degrees,as_dict=False)
+    d_counts = p_probs*nr_nodes
+    
+    k_nn = {}
+    for k,d in zip(k_vals.tolist(),d_counts.tolist()):
+        k_nn[k] = k_sums[k] if k < len(k_sums) else 0
+        if d!=0:
+            k_nn[k] /= d
+    
+    return k_nn
+
+
+def _networkx_degree_correlation(graph,direction=None):
+    '''
+    degree_correlation with nx.average_neighbor_degree.
+    '''
     d_dist = degree_dist(graph,direction=direction)
     nr_nodes = graph.number_of_nodes()
     d_dist = {k:v*nr_nodes for k,v in d_dist.items()}# we need the number of nodes , not the possibility
@@ -1,5 +1,10 @@
+import networkx as nx
 import numpy as np
 
+from csr_graph import CSRGraph, edge_arrays
+from instrumentation import current_monitor
+from parallel import map_with_shared_state
+
 def degree_preserving_randomisation(graph,nr_rewirings):
     ''' 
     Return a randomised version of the graph, while preserving its edge-distribution.
@@ -9,7 +14,7 @@ def degree_preserving_randomisation(graph,nr_rewirings):
 
     Parameters
     ----------
-    graph : networkx graph object
+    graph : networkx graph object or CSRGraph
 
     nr_rewirings : number of successful edge swapping.
 
@@ -17,7 +22,22 @@ def degree_preserving_randomisation(graph,nr_rewirings):
     ------
     graph_copy : a new graph object, randomised, its edges are swapped nr_rewirings times randomly.
     '''
-    graph_copy=graph.copy()
+    monitor = current_monitor()
+    with monitor.phase('graph copy'):
+        if isinstance(graph,CSRGraph):
+            graph = graph.to_networkx()
+        graph_copy=graph.copy()
+    
+    with monitor.phase('swaps'):
+        _swap_edges_of_graph(graph,graph_copy,nr_rewirings,monitor)
+    
+    return graph_copy
+
+
+def _swap_edges_of_graph(graph,graph_copy,nr_rewirings,monitor):
+    '''
+    The swap loop of degree_preserving_randomisation, graph_copy is changed in place.
+    '''
     count_rewirings=int(0)
     
     while count_rewirings < nr_rewirings:
@@ -41,5 +61,382 @@ def degree_preserving_randomisation(graph,nr_rewirings):
                 graph_copy.add_edge(s2,t1)
                 
                 count_rewirings += 1
+                if monitor.enabled:
+                    monitor.count('swaps accepted')
+        
+        if monitor.enabled:
+            monitor.count('swaps attempted')
+            monitor.progress('swaps',count_rewirings,nr_rewirings)
+
+
+def _edge_array(graph):
+    '''
+    Return the node list of the graph and its edges as an (E,2) int64 array of node indices.
+    '''
+    nodes,src,dst = edge_arrays(graph)
+    edges = np.empty((len(src),2),dtype=np.int64)
+    edges[:,0] = src
+    edges[:,1] = dst
+    
+    return nodes,edges
+
+
+def _pair_keys(s,t,nr_nodes,directed=False):
+    '''
+    Hashable integer key of node pairs. For undirected pairs the smaller index comes first.
+    '''
+    if directed:
+        return s*nr_nodes + t
+    return np.minimum(s,t)*nr_nodes + np.maximum(s,t)
+
+
+def _graph_from_edges(graph,nodes,edges,multigraph=False):
+    '''
+    Return a new graph with the nodes (and node attributes) of graph and the edges of the edge array.
+    For a CSRGraph a new CSRGraph is returned.
+    If multigraph is True and graph is a simple graph, a MultiGraph (MultiDiGraph) is returned,
+    so the parallel edges of the array are kept.
+    '''
+    if isinstance(graph,CSRGraph):
+        return CSRGraph(nodes,edges[:,0],edges[:,1],directed=graph.is_directed(),
+                        multigraph=graph.is_multigraph() or multigraph)
+    
+    if multigraph and not graph.is_multigraph():
+        graph_copy = nx.MultiDiGraph() if graph.is_directed() else nx.MultiGraph()
+    else:
+        graph_copy = graph.__class__()
+    graph_copy.graph.update(graph.graph)
+    graph_copy.add_nodes_from(graph.nodes(data=True))
+    graph_copy.add_edges_from((nodes[u],nodes[v]) for u,v in edges.tolist())
     
     return graph_copy
+
+
+def _swap_edges(edges,nr_nodes,nr_rewirings,rng,batch_size=10000,directed=False,self_loops=False,multi_edges=False,
+                sample_every=None,stop_tol=None,patience=3,max_idle_batches=100):
+    '''
+    Swap the edges of the edge array in place, until nr_rewirings swaps are successful.
+    The (s1,t1),(s2,t2) edges are swapped to (s1,t2),(s2,t1), so for directed edges
+    the in- and out-degrees are preserved too.
+    
+    The candidate edge pairs are drawn in batches. In one batch every edge is used
+    at most once, so the accepted swaps of a batch can be written back together.
+    Only the existence checks run in a Python loop, they are O(1) lookups in a dict of pair key multiplicities.
+    
+    If self_loops is False, the swaps don't create self-loops (and don't move the existing ones).
+    If multi_edges is False, the swaps don't create edges which already exist.
+    
+    If sample_every is given, after every sample_every successful swaps a row is added to the trace:
+    (swaps, attempts, acceptance rate since the previous row, fraction of the original edges still present).
+    With stop_tol the swapping stops before nr_rewirings, when the fraction of the original edges
+    changes less than stop_tol between patience consecutive rows. On small graphs stop_tol can be
+    finer than the random fluctuation of the fraction, so the tolerance is at least
+    sqrt(number of original edges still present)/E (and at least 1/E).
+    
+    If no swap is accepted in max_idle_batches consecutive batches (e.g. in a star graph every pair
+    of edges shares the center), no more swaps are possible and the swapping stops.
+
+    Returns
+    -------
+    count_rewirings : number of successful swaps.
+    
+    count_attempts : number of attempted swaps (the edge pairs used twice in a batch are not counted).
+    
+    trace : list of the trace rows, empty if sample_every is None.
+    
+    stalled : bool, True if the swapping stopped because no swap was accepted.
+    '''
+    nr_edges = len(edges)
+    tracking = sample_every is not None
+    
+    adjacency = {}
+    if not multi_edges or tracking:
+        for key in _pair_keys(edges[:,0],edges[:,1],nr_nodes,directed).tolist():
+            adjacency[key] = adjacency.get(key,0)+1
+    
+    original = dict(adjacency) if tracking else {}
+    nr_original = nr_edges # number of original edges still present
+    
+    count_rewirings = 0
+    count_attempts = 0
+    window_attempts = 0
+    trace = []
+    stable_rows = 0
+    stopped = False
+    idle_batches = 0
+    stalled = nr_edges < 2 # there is no pair of edges to swap
+    monitor = current_monitor()
+    
+    while count_rewirings < nr_rewirings and not stopped and not stalled:
+        batch_start_attempts = count_attempts
+        size = min(batch_size,nr_edges)
+        rand_edge_ids = rng.integers(0,nr_edges,size=(size,2)) # randomly select pairs of edges
+        flips = rng.random(size) < 0.5 # the second undirected edge is used in both orientation
+        if directed:
+            flips[:] = False
+        
+        # every edge is used only by its first pair in the batch:
+        uniq,first_idx = np.unique(rand_edge_ids.ravel(),return_index=True)
+        owner = (first_idx//2)[np.searchsorted(uniq,rand_edge_ids)]
+        valid = (owner[:,0] == np.arange(size)) & (owner[:,1] == np.arange(size))
+        
+        rand_edge_ids,flips = rand_edge_ids[valid],flips[valid]
+        nr_candidates = len(rand_edge_ids)
+        
+        s1,t1 = edges[rand_edge_ids[:,0],0],edges[rand_edge_ids[:,0],1] # source, target of first edge
+        s2,t2 = edges[rand_edge_ids[:,1],0],edges[rand_edge_ids[:,1],1] # source, target of second edge
+        s2,t2 = np.where(flips,t2,s2),np.where(flips,s2,t2)
+        
+        valid = rand_edge_ids[:,0] != rand_edge_ids[:,1] # different edges
+        valid &= (s1!=s2) & (t1!=t2) # otherwise the swap gives back the same edges
+        if not self_loops:# 4 different nodes
+            valid &= (s1!=t1) & (s1!=t2) & (t1!=s2) & (s2!=t2)
+        
+        if not tracking:
+            # the rejected pairs are not needed for the trace, the attempts are counted from the positions:
+            positions = np.flatnonzero(valid)
+            rand_edge_ids,s1,t1,s2,t2,valid = rand_edge_ids[valid],s1[valid],t1[valid],s2[valid],t2[valid],valid[valid]
+        
+        accepted = np.zeros(len(rand_edge_ids),dtype=bool)
+        
+        if multi_edges and not tracking:
+            accepted[:nr_rewirings-count_rewirings] = True
+            count_rewirings += int(accepted.sum())
+        else:
+            old_keys_1 = _pair_keys(s1,t1,nr_nodes,directed).tolist()
+            old_keys_2 = _pair_keys(s2,t2,nr_nodes,directed).tolist()
+            new_keys_1 = _pair_keys(s1,t2,nr_nodes,directed).tolist()
+            new_keys_2 = _pair_keys(s2,t1,nr_nodes,directed).tolist()
+            valid = valid.tolist()
+            
+            for i in range(len(rand_edge_ids)):
+                if count_rewirings >= nr_rewirings:
+                    break
+                if tracking:
+                    count_attempts += 1
+                    window_attempts += 1
+                if not valid[i]:
+                    continue
+                
+                # after a swap new edge could not exist before:
+                k1,k2 = new_keys_1[i],new_keys_2[i]
+                if multi_edges or (k1 not in adjacency and k2 not in adjacency and k1 != k2):
+                    for key in (old_keys_1[i],old_keys_2[i]):
+                        if adjacency[key] <= original.get(key,0):
+                            nr_original -= 1
+                        if adjacency[key] == 1:
+                            del adjacency[key]
+                        else:
+                            adjacency[key] -= 1
+                    for key in (k1,k2):
+                        if adjacency.get(key,0) < original.get(key,0):
+                            nr_original += 1
+                        adjacency[key] = adjacency.get(key,0)+1
+                    accepted[i] = True
+                    count_rewirings += 1
+                    
+                    if tracking and count_rewirings % sample_every == 0:
+                        fraction = nr_original/nr_edges
+                        trace.append((count_rewirings,count_attempts,sample_every/window_attempts,fraction))
+                        window_attempts = 0
+                        
+                        if stop_tol is not None and len(trace) > 1:
+                            # the random fluctuation of the number of original edges is about its square root:
+                            tol = max(stop_tol,np.sqrt(max(nr_original,1))/nr_edges)
+                            if abs(trace[-2][3]-fraction) < tol:
+                                stable_rows += 1
+                            else:
+                                stable_rows = 0
+                            if stable_rows >= patience:
+                                stopped = True
+                                break
+        
+        if not tracking:
+            # every candidate is attempted, except the ones after the last needed swap:
+            if count_rewirings >= nr_rewirings:
+                count_attempts += int(positions[np.flatnonzero(accepted)[-1]])+1
+            else:
+                count_attempts += nr_candidates
+        
+        edges[rand_edge_ids[accepted,0]] = np.column_stack((s1[accepted],t2[accepted]))
+        edges[rand_edge_ids[accepted,1]] = np.column_stack((s2[accepted],t1[accepted]))
+        
+        idle_batches = 0 if accepted.any() else idle_batches+1
+        stalled = idle_batches >= max_idle_batches
+        
+        if monitor.enabled:
+            monitor.count('swaps attempted',count_attempts-batch_start_attempts)
+            monitor.count('swaps accepted',int(accepted.sum()))
+            monitor.progress('swaps',count_rewirings,nr_rewirings)
+    
+    return count_rewirings,count_attempts,trace,stalled
+
+
+def degree_preserving_randomisation_fast(graph,nr_rewirings,seed=None,batch_size=10000,return_edges=False,
+                                         self_loops=False,multi_edges=False,
+                                         diagnostics=False,sample_every=None,stop_tol=1e-3,patience=3):
+    ''' 
+    Return a randomised version of the graph, while preserving its edge-distribution.
+    The same randomisation as degree_preserving_randomisation, but the edges are kept in a numpy
+    array and a hash map of node pairs, so one swap costs O(1) instead of O(E).
+    Only the successful swaps count.
+    The networkx graph is built only at the end, the swapped edges lose their attributes.
+    
+    The graph can be directed, then the in- and out-degree of every node is preserved.
+    The graph can be a multigraph too, its parallel edges are handled as separate edges.
+
+    Parameters
+    ----------
+    graph : networkx graph object or CSRGraph
+
+    nr_rewirings : number of successful edge swapping, or "auto".
+                   With "auto" the swapping stops when the fraction of the original edges still present
+                   in the graph reaches a plateau (at most 100 times the number of edges are swapped).
+                   The swapping stops early in both cases, if no more swaps are possible (see stalled).
+    
+    seed : None, int or numpy.random.Generator, the random state of the swaps.
+    
+    batch_size : number of edge pairs drawn at once.
+    
+    return_edges : bool, if True the graph is not built, the node list and the edge array are returned.
+    
+    self_loops : bool, if False (default) the swaps can't create self-loops.
+    
+    multi_edges : bool, if False (default) the swaps can't create parallel edges.
+                  If True and graph is a simple Graph (DiGraph), a MultiGraph (MultiDiGraph) is returned,
+                  otherwise the parallel edges would be merged and the degrees would change.
+    
+    diagnostics : bool, if True the mixing diagnostics are returned too.
+    
+    sample_every : the diagnostics are sampled after every sample_every successful swaps.
+                   The default is the tenth of the number of edges.
+    
+    stop_tol, patience : in "auto" mode the swapping stops, when the fraction of the original edges
+                         changes less than stop_tol in patience consecutive samples.
+                         The tolerance is scaled up to the random fluctuation of the fraction
+                         on small graphs (at least 1/E), so "auto" swaps a few times E edges at any size.
+
+    Returns
+    ------
+    graph_copy : a new graph object, randomised, its edges are swapped nr_rewirings times randomly.
+    
+    or if return_edges is True:
+    
+    nodes, edges : list of nodes and (E,2) numpy array of node indices of the randomised edges.
+    
+    and if diagnostics is True, a dict as the last element of the returned tuple:
+    
+        nr_rewirings : number of successful swaps.
+        nr_attempts : number of attempted swaps.
+        stalled : True if the swapping stopped early, because no swap was accepted in 100 consecutive batches.
+        swaps : number of successful swaps at the samples.
+        attempts : number of attempted swaps at the samples.
+        acceptance_rate : the rate of successful swaps between the samples.
+        original_edge_fraction : fraction of the original edges still present at the samples.
+    '''
+    rng = np.random.default_rng(seed)
+    monitor = current_monitor()
+    with monitor.phase('graph copy'):
+        nodes,edges = _edge_array(graph)
+    
+    auto = nr_rewirings == 'auto'
+    if auto:
+        nr_rewirings = 100*len(edges)
+    if (diagnostics or auto) and sample_every is None:
+        sample_every = max(1,len(edges)//10)
+    if sample_every is not None and sample_every < 1:
+        raise ValueError('sample_every must be at least 1.')
+    
+    with monitor.phase('swaps'):
+        count_rewirings,count_attempts,trace,stalled = _swap_edges(edges,len(nodes),nr_rewirings,rng,batch_size=batch_size,
+                                            directed=graph.is_directed(),self_loops=self_loops,multi_edges=multi_edges,
+                                            sample_every=sample_every,stop_tol=stop_tol if auto else None,patience=patience)
+    if stalled and not auto:
+        print('No more swaps are possible, only %d of the %d swaps are done.'%(count_rewirings,nr_rewirings))
+    
+    with monitor.phase('graph build'):
+        result = (nodes,edges) if return_edges else (_graph_from_edges(graph,nodes,edges,multigraph=multi_edges),)
+    
+    if diagnostics:
+        trace = np.array(trace,dtype=float).reshape(-1,4)
+        result += ({'nr_rewirings':count_rewirings,
+                    'nr_attempts':count_attempts,
+                    'stalled':stalled,
+                    'swaps':trace[:,0].astype(np.int64),
+                    'attempts':trace[:,1].astype(np.int64),
+                    'acceptance_rate':trace[:,2],
+                    'original_edge_fraction':trace[:,3]},)
+    
+    return result if len(result) > 1 else result[0]
+
+
+def _randomised_replica_metrics(state,seed_seq):
+    '''
+    Randomise one replica and compute the metrics on it, runs in the worker processes.
+    '''
+    rng = np.random.default_rng(seed_seq)
+    edges = state['edges'].copy()
+    
+    _swap_edges(edges,len(state['nodes']),state['nr_rewirings'],rng,**state['swap_options'])
+    replica = _graph_from_edges(state['graph'],state['nodes'],edges,multigraph=state['swap_options']['multi_edges'])
+    
+    return {name:metric(replica) for name,metric in state['metrics'].items()}
+
+
+def randomised_ensemble(graph,nr_replicas,nr_rewirings,metrics,seed=None,n_jobs=None,batch_size=10000,
+                        self_loops=False,multi_edges=False):
+    '''
+    Generates nr_replicas degree preserving randomisations of the graph and computes the metrics on each of them.
+    The replicas are not kept in memory, only the metric values are yielded one by one.
+    
+    Every replica gets an independent random stream spawned from the seed,
+    so for a fixed seed the results are the same for any number of workers.
+
+    Parameters
+    ----------
+    graph : networkx graph object or CSRGraph, directed graphs preserve the in- and out-degrees.
+
+    nr_replicas : number of randomised graphs.
+    
+    nr_rewirings : number of successful edge swapping in one replica.
+    
+    metrics : dict, keys are names, values are functions with one graph parameter,
+              e.g. {'grc': hierarchy.global_reaching_centrality}. Use functools.partial for the other
+              parameters. For n_jobs > 1 the functions must be picklable.
+    
+    seed : None or int, the random state of the ensemble.
+    
+    n_jobs : None or int, number of worker processes. None or 1 is serial, -1 uses every CPU.
+    
+    batch_size, self_loops, multi_edges : options of the swaps, see degree_preserving_randomisation_fast.
+                                          With multi_edges the replicas of a simple graph are multigraphs.
+
+    Returns
+    ------
+    generator of (replica index, dict of metric values) pairs, in the order of the replicas.
+    '''
+    nodes,edges = _edge_array(graph)
+    
+    # only the nodes are shared with the workers, not the edges:
+    if isinstance(graph,CSRGraph):
+        skeleton = CSRGraph([],[],[],directed=graph.is_directed(),multigraph=graph.is_multigraph())
+    else:
+        skeleton = graph.__class__()
+        skeleton.graph.update(graph.graph)
+        skeleton.add_nodes_from(graph.nodes(data=True))
+    
+    state = {'graph':skeleton,
+             'nodes':nodes,
+             'edges':edges,
+             'nr_rewirings':nr_rewirings,
+             'metrics':metrics,
+             'swap_options':{'batch_size':batch_size,
+                             'directed':graph.is_directed(),
+                             'self_loops':self_loops,
+                             'multi_edges':multi_edges}}
+    
+    seed_seqs = np.random.SeedSequence(seed).spawn(nr_replicas)
+    results = map_with_shared_state(_randomised_replica_metrics,seed_seqs,state,n_jobs=n_jobs,progress='replicas')
+    
+    for i,result in enumerate(results):
+        yield i,result
@@ -0,0 +1,157 @@
+'''
+Opt-in instrumentation of the long running functions: phase timers, counters and progress events with ETA.
+
+The functions ask for the current monitor, which is a no-op object unless a monitoring block is active,
+so without monitoring the cost is one attribute check per batch (or per source) in the hot loops.
+
+Example:
+-------
+with monitoring(print_event,interval=10) as monitor:
+    grc = hierarchy.global_reaching_centrality(G,m=2)
+monitor.summary()
+
+The events are dicts, passed to the callback:
+    {'event':'phase_start','phase':name}
+    {'event':'phase_end','phase':name,'seconds':duration}
+    {'event':'progress','task':name,'done':done,'total':total,'elapsed':seconds,'eta':seconds,'counters':{...}}
+
+Only the calling process is monitored, the workers of a process pool report nothing,
+the parallel functions report the progress of the finished chunks.
+'''
+import contextlib
+import time
+from collections import defaultdict
+
+
+class Monitor:
+    '''
+    Collects the phase times and the counters, and sends the events to the callback.
+
+    Parameters:
+    ----------
+    callback : None or function of one event dict.
+
+    interval : minimal number of seconds between two progress events of a task
+               (the first and the last progress of a task is always sent).
+    '''
+    enabled = True
+
+    def __init__(self,callback=None,interval=1.0):
+        self.callback = callback
+        self.interval = interval
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+        self._tasks = {} # task -> (start time, done at start, time of the last event, last done)
+
+    def _emit(self,event):
+        if self.callback is not None:
+            self.callback(event)
+
+    @contextlib.contextmanager
+    def phase(self,name):
+        self._emit({'event':'phase_start','phase':name})
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            seconds = time.perf_counter()-start
+            self.timers[name] += seconds
+            self._emit({'event':'phase_end','phase':name,'seconds':seconds})
+
+    def count(self,name,value=1):
+        self.counters[name] += value
+
+    def progress(self,task,done,total):
+        now = time.perf_counter()
+        start,start_done,last_event,last_done = self._tasks.get(task,(now,done,None,0))
+        if done < last_done: # the task started again
+            start,start_done,last_event = now,done,None
+
+        finished = done >= total
+        if last_event is not None and now-last_event < self.interval and not finished:
+            self._tasks[task] = (start,start_done,last_event,done)
+            return
+        self._tasks[task] = (start,start_done,now,done)
+
+        # the rate is measured from the first progress of the task:
+        elapsed = now-start
+        eta = elapsed/(done-start_done)*(total-done) if done > start_done else None
+        self._emit({'event':'progress','task':task,'done':done,'total':total,
+                    'elapsed':elapsed,'eta':eta,'counters':dict(self.counters)})
+        if finished:
+            del self._tasks[task]
+
+    def summary(self):
+        '''
+        Returns:
+        -------
+        dict with the total seconds of every phase and the final value of every counter.
+        '''
+        return {'phases':dict(self.timers),'counters':dict(self.counters)}
+
+
+class _NullMonitor:
+    '''
+    The monitor outside of a monitoring block, it does nothing.
+    '''
+    enabled = False
+    _context = contextlib.nullcontext()
+
+    def phase(self,name):
+        return self._context
+
+    def count(self,name,value=1):
+        pass
+
+    def progress(self,task,done,total):
+        pass
+
+    def summary(self):
+        return {'phases':{},'counters':{}}
+
+
+_NULL_MONITOR = _NullMonitor()
+_current = _NULL_MONITOR
+
+
+def current_monitor():
+    '''
+    The monitor of the active monitoring block, or a no-op monitor (its enabled attribute is False).
+    '''
+    return _current
+
+
+@contextlib.contextmanager
+def monitoring(callback=None,interval=1.0):
+    '''
+    Turns on the instrumentation inside the with block.
+
+    Parameters:
+    ----------
+    callback : None or function of one event dict, e.g. print_event.
+
+    interval : minimal number of seconds between two progress events of a task.
+
+    Returns:
+    -------
+    monitor : the Monitor of the block, its summary() has the phase times and the counters.
+    '''
+    global _current
+    previous = _current
+    _current = Monitor(callback=callback,interval=interval)
+    try:
+        yield _current
+    finally:
+        _current = previous
+
+
+def print_event(event):
+    '''
+    A simple callback, it prints the progress events and the end of the phases.
+    '''
+    if event['event'] == 'progress':
+        eta = '?' if event['eta'] is None else '%.0f s'%event['eta']
+        print('%s: %d/%d (%.1f%%), elapsed %.0f s, ETA %s'%(event['task'],event['done'],event['total'],
+              100*event['done']/max(event['total'],1),event['elapsed'],eta),flush=True)
+    elif event['event'] == 'phase_end':
+        print('%s: %.2f s'%(event['phase'],event['seconds']),flush=True)
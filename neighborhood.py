@@ -1,15 +1,22 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
 import networkx as nx
 import numpy as np
 
+from csr_graph import CSRGraph, bfs_lengths, csr_adjacency, edge_arrays, multi_source_bfs, multi_source_bfs_levels, visited_pairs, _bit_counts, _opposite
+from instrumentation import current_monitor
+from parallel import map_with_shared_state, split_items
+
 
 def neighbors_at_n_step(G, node,cutoff=1 ,direction=None):
     '''
     Returns the nodes at a given range, from a central node.
-
+    For every distance up to the cutoff, or for many central nodes, hop_profiles gives all the rings in one traversal.
 
     Parameters
     ----------
-    G : networkx object
+    G : networkx object or CSRGraph
 
     node : name of node in the central
 
@@ -29,6 +36,10 @@ def neighbors_at_n_step(G, node,cutoff=1 ,direction=None):
     A list of node names, which are at given distance from the central node.
 
     '''
+    if isinstance(G,CSRGraph):
+        path_lengths = bfs_lengths(G,node,cutoff=cutoff,direction=direction)
+        return [node for node,length in path_lengths.items() if length == cutoff]
+    
     if direction == None:
         G = G.copy()
         G = G.to_undirected()
@@ -58,7 +69,7 @@ def neighbors_within_n_step(G, node,cutoff=1,direction=None):
 
     Parameters
     ----------
-    G : networkx object
+    G : networkx object or CSRGraph
 
     node : name of node in the central
 
@@ -78,6 +89,9 @@ def neighbors_within_n_step(G, node,cutoff=1,direction=None):
     A list of node names, which are within a given distance from the central node.
 
     '''
+    if isinstance(G,CSRGraph):
+        return list(bfs_lengths(G,node,cutoff=cutoff,direction=direction))
+    
     if direction == None:
         G = G.copy()
         G = G.to_undirected()
@@ -102,7 +116,7 @@ def subgraph_within_n_step(G, node,cutoff=1,direction=None,center=True):
     
     Parameters
     ----------
-    G : networkx object
+    G : networkx object or CSRGraph
 
     node : name of node in the central
 
@@ -123,6 +137,10 @@ def subgraph_within_n_step(G, node,cutoff=1,direction=None,center=True):
     A subgraph (networkx object), its nodes are within a given distance from the central node. 
 
     '''
+    if isinstance(G,CSRGraph):
+        nodes = [n for n in bfs_lengths(G,node,cutoff=cutoff,direction=direction) if center or n != node]
+        return G.subgraph(nodes,directed=direction != None)
+    
     if direction == None:
         G = G.copy()
         G = G.to_undirected()
@@ -142,13 +160,16 @@ def subgraph_within_n_step(G, node,cutoff=1,direction=None,center=True):
 
 
 
-def subgraphs_of_nodes_within_n_steps(G,nodes,cutoff=1,direction=None,center=True):
+def subgraphs_of_nodes_within_n_steps(G,nodes,cutoff=1,direction=None,center=True,edge_indices=False,batch_size=512):
     '''
     Returns the composed subgraphs of nodes, that are within a given range from given central nodes.
+    An edge is in the composed graph, if both of its ends are in the subgraph of one of the central nodes.
+    The subgraphs are found together by a bit-parallel BFS, and the edges are selected with one mask
+    over the edges of G, so the composed graph is built only once.
     
     Parameters
     ----------
-    G : networkx object, must be MultiGraph 
+    G : networkx object (must be MultiGraph) or CSRGraph
 
     nodes : name of nodes in the centrals
 
@@ -163,39 +184,169 @@ def subgraphs_of_nodes_within_n_steps(G,nodes,cutoff=1,direction=None,center=Tru
             If direction = out : We use the number of outgoing degrees, as degree.
     
     center : bool, exclueding the central node in the subgraph. Default is True
+    
+    edge_indices : bool, if True the networkx graph is not built, the indices are returned.
+    
+    batch_size : number of central nodes traversed together.
 
     Returns:
     ------
-    A MultiGraph (networkx object)
+    A MultiGraph (networkx object), the edges keep their direction, keys and attributes from G.
+    
+    or if edge_indices is True:
+    
+    node_ids, edge_ids : numpy arrays, the indices of the nodes in list(G.nodes())
+                         and of the edges in list(G.edges()).
+
+    '''
+    graph_nodes,src,dst = edge_arrays(G)
+    out_indptr,out_indices = csr_adjacency(G,direction=direction)[1:]
+    if direction == None or not G.is_directed():
+        in_indptr,in_indices = out_indptr,out_indices
+    else:
+        in_indptr,in_indices = csr_adjacency(G,direction=_opposite(direction))[1:]
+    
+    index = G.index if isinstance(G,CSRGraph) else {n:i for i,n in enumerate(graph_nodes)}
+    sources = np.array([index[n] for n in nodes],dtype=np.int64)
+    
+    node_mask = np.zeros(len(graph_nodes),dtype=bool)
+    edge_mask = np.zeros(len(src),dtype=bool)
+    
+    for batch_sources,visited in multi_source_bfs((out_indptr,out_indices),(in_indptr,in_indices),sources,
+                                                  cutoff=cutoff,batch_size=batch_size):
+        if not center:
+            positions = np.arange(len(batch_sources))
+            bits = np.left_shift(np.uint64(1),(positions%64).astype(np.uint64))
+            np.bitwise_and.at(visited,(batch_sources,positions//64),~bits)
+        node_mask |= np.bitwise_or.reduce(visited,axis=1) != 0
+        edge_mask |= np.bitwise_or.reduce(visited[src] & visited[dst],axis=1) != 0
+    
+    node_ids,edge_ids = np.flatnonzero(node_mask),np.flatnonzero(edge_mask)
+    if edge_indices:
+        return node_ids,edge_ids
+    
+    return _multigraph_of_ids(G,graph_nodes,src,dst,_edge_list(G),node_ids,edge_ids)
+
+
+def _edge_list(G):
+    '''
+    The edges of G with keys and data, in the order of the edge arrays, None for a CSRGraph.
+    '''
+    if isinstance(G,CSRGraph):
+        return None
+    return list(G.edges(keys=True,data=True) if G.is_multigraph() else G.edges(data=True))
 
+
+def _multigraph_of_ids(G,graph_nodes,src,dst,edges,node_ids,edge_ids):
+    '''
+    A MultiDiGraph of the given node and edge indices of G, with their attributes.
     '''
-    graphs = [] #list of subgraphs
     graph_ret = nx.MultiDiGraph()
-    for n in nodes:
-        tmp_graph = subgraph_within_n_step(G,
-                                           node=n,
-                                           cutoff=cutoff,
-                                           direction=direction,
-                                           center=center)
-        graphs.append(tmp_graph)
+    if isinstance(G,CSRGraph):
+        graph_ret.add_nodes_from(graph_nodes[i] for i in node_ids.tolist())
+        graph_ret.add_edges_from((graph_nodes[src[i]],graph_nodes[dst[i]]) for i in edge_ids.tolist())
+        return graph_ret
     
-    for g in graphs:
-        graph_ret = nx.compose(graph_ret,g)
+    graph_ret.add_nodes_from((graph_nodes[i],G.nodes[graph_nodes[i]]) for i in node_ids.tolist())
+    graph_ret.add_edges_from(edges[i] for i in edge_ids.tolist())
     
     return graph_ret
 
 
+def iter_subgraphs_of_nodes_within_n_steps(G,nodes,cutoff=1,direction=None,center=True,edge_indices=False,
+                                           batch_size=512,prefetch=False):
+    '''
+    Generator variant of subgraphs_of_nodes_within_n_steps: the subgraph of every central node is yielded
+    separately, one at a time, instead of composing them into one graph.
+    Only one batch of central nodes is traversed at once, so the memory doesn't grow with the number of nodes.
+    
+    Parameters
+    ----------
+    G, nodes, cutoff, direction, center : see subgraphs_of_nodes_within_n_steps.
+    
+    edge_indices : bool, if True the networkx graphs are not built, the indices are yielded.
+    
+    batch_size : number of central nodes traversed together.
+    
+    prefetch : bool, if True the next batch is traversed in a background thread,
+               while the subgraphs of the current one are consumed.
+
+    Returns:
+    ------
+    generator of (node, subgraph) pairs, in the order of nodes. The subgraph is a MultiDiGraph,
+    the edges keep their direction, keys and attributes from G,
+    
+    or if edge_indices is True, (node, (node_ids, edge_ids)) pairs: the indices of the nodes
+    in list(G.nodes()) and of the edges in list(G.edges()).
+    '''
+    graph_nodes,src,dst = edge_arrays(G)
+    out_indptr,out_indices = csr_adjacency(G,direction=direction)[1:]
+    if direction == None or not G.is_directed():
+        in_indptr,in_indices = out_indptr,out_indices
+    else:
+        in_indptr,in_indices = csr_adjacency(G,direction=_opposite(direction))[1:]
+    
+    index = G.index if isinstance(G,CSRGraph) else {n:i for i,n in enumerate(graph_nodes)}
+    nodes = list(nodes)
+    edges = None if edge_indices else _edge_list(G)
+    
+    def traverse(batch):
+        sources = np.array([index[n] for n in batch],dtype=np.int64)
+        # the whole batch is traversed together:
+        batch_sources,visited = next(multi_source_bfs((out_indptr,out_indices),(in_indptr,in_indices),sources,
+                                                      cutoff=cutoff,batch_size=len(sources)))
+        positions = np.arange(len(batch_sources))
+        if not center:
+            bits = np.left_shift(np.uint64(1),(positions%64).astype(np.uint64))
+            np.bitwise_and.at(visited,(batch_sources,positions//64),~bits)
+        node_positions,node_ids = visited_pairs(visited,len(batch_sources))
+        edge_positions,edge_ids = visited_pairs(visited[src] & visited[dst],len(batch_sources))
+        return (np.split(node_ids,np.searchsorted(node_positions,positions[1:])),
+                np.split(edge_ids,np.searchsorted(edge_positions,positions[1:])))
+    
+    batches = [nodes[i:i+batch_size] for i in range(0,len(nodes),batch_size)]
+    for batch,(node_id_list,edge_id_list) in zip(batches,_iter_batches(traverse,batches,prefetch)):
+        for node,node_ids,edge_ids in zip(batch,node_id_list,edge_id_list):
+            if edge_indices:
+                yield node,(node_ids,edge_ids)
+            else:
+                yield node,_multigraph_of_ids(G,graph_nodes,src,dst,edges,node_ids,edge_ids)
+
+
+def _iter_batches(func,batches,prefetch=False):
+    '''
+    Yields func(batch) for every batch. With prefetch the next batch is computed in a background thread,
+    while the result of the current one is consumed, so at most two results are in memory.
+    '''
+    if not prefetch:
+        for batch in batches:
+            yield func(batch)
+        return
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = None
+        for batch in batches:
+            next_future = executor.submit(func,batch)
+            if future is not None:
+                yield future.result()
+            future = next_future
+        if future is not None:
+            yield future.result()
+
+
 
-def subgraphs_around_nodes_within_cutoff(G,nodelist,cutoff=1,direction=None):
+def subgraphs_around_nodes_within_cutoff(G,nodelist,cutoff=1,direction=None,n_jobs=None):
     '''
     Returns a list of subgraphs, that are composed from the seeds in the nodelist.
     Each graph is the subgraph around one of the node in the nodelist.
     
-    It uses the neighbors_within_n_step function.
+    It uses the neighbors_within_n_step function, for a CSRGraph the batched ego_networks function.
+    For many seeds on unweighted graphs, ego_networks is much faster.
+    iter_subgraphs_around_nodes_within_cutoff yields the subgraphs one at a time, without keeping all of them.
 
     Parameters
     ----------
-    G : networkx object 
+    G : networkx object or CSRGraph
 
     nodelist : name of nodes in the centrals
 
@@ -209,23 +360,241 @@ def subgraphs_around_nodes_within_cutoff(G,nodelist,cutoff=1,direction=None):
 
             If direction = out : We use the number of outgoing degrees, as degree.
 
+    n_jobs : None or int, number of worker processes. None or 1 is serial, -1 uses every CPU.
+             The seeds are split into chunks, the graph is sent once to every worker,
+             the subgraphs are built in the calling process. Few seeds run serially.
+
     Returns:
     ------
     graphs : A list of networkx objects.
 
     '''
-    environment_of_nodes = []
-    graphs = [] 
+    if isinstance(G,CSRGraph):
+        return ego_networks(G,nodelist,cutoff=cutoff,direction=direction,as_subgraphs=True,n_jobs=n_jobs)
     
-    for i in range(len(nodelist)):
-        environment_of_nodes.append(neighbors_within_n_step(G, nodelist[i],cutoff=cutoff,direction=direction))
-        
-        graphs.append(G.subgraph(environment_of_nodes[i]))
+    chunks = split_items(list(nodelist),n_jobs,min_size=16)
+    state = (G,cutoff,direction)
+    environment_of_nodes = itertools.chain.from_iterable(map_with_shared_state(_environments,chunks,state,n_jobs=n_jobs,
+                                                                               progress='seed chunks'))
+    
+    graphs = [G.subgraph(environment) for environment in environment_of_nodes]
         
     return graphs
 
 
+def _environments(state,nodelist):
+    G,cutoff,direction = state
+    return [neighbors_within_n_step(G,node,cutoff=cutoff,direction=direction) for node in nodelist]
+
+
+def iter_subgraphs_around_nodes_within_cutoff(G,nodelist,cutoff=1,direction=None,as_nodes=False,
+                                              batch_size=512,prefetch=False):
+    '''
+    Generator variant of subgraphs_around_nodes_within_cutoff: the subgraphs are yielded one at a time,
+    only one batch of seeds is processed at once, so the memory doesn't grow with the number of seeds.
+    
+    Parameters
+    ----------
+    G, nodelist, cutoff, direction : see subgraphs_around_nodes_within_cutoff.
+    
+    as_nodes : bool, if True the subgraphs are not built, the nodes around the seed are yielded
+               as a numpy array of their indices in list(G.nodes()).
+    
+    batch_size : number of seeds processed together.
+    
+    prefetch : bool, if True the next batch is processed in a background thread,
+               while the subgraphs of the current one are consumed.
+
+    Returns:
+    ------
+    generator of (seed, subgraph) pairs in the order of nodelist, the subgraphs are the same as
+    in subgraphs_around_nodes_within_cutoff, or (seed, node index array) pairs if as_nodes is True.
+    '''
+    nodelist = list(nodelist)
+    batches = [nodelist[i:i+batch_size] for i in range(0,len(nodelist),batch_size)]
+    
+    if isinstance(G,CSRGraph):
+        out_csr = csr_adjacency(G,direction=direction)[1:]
+        in_csr = out_csr if direction == None or not G.is_directed() else csr_adjacency(G,direction=_opposite(direction))[1:]
+        state = (out_csr,in_csr,batch_size)
+        
+        def environments(batch):
+            return _ego_memberships(state,(np.array([G.index[n] for n in batch],dtype=np.int64),cutoff))
+    else:
+        state = (G,cutoff,direction)
+        index = {n:i for i,n in enumerate(G.nodes())} if as_nodes else None
+        
+        def environments(batch):
+            return _environments(state,batch)
+    
+    for batch,members in zip(batches,_iter_batches(environments,batches,prefetch)):
+        for seed,member in zip(batch,members):
+            if isinstance(G,CSRGraph):
+                yield seed,(member if as_nodes else G.subgraph([G.nodes[i] for i in member.tolist()]))
+            elif as_nodes:
+                yield seed,np.array([index[n] for n in member],dtype=np.int64)
+            else:
+                yield seed,G.subgraph(member)
+
+
+
+
+
+def ego_networks(G,seeds,cutoff=1,direction=None,as_subgraphs=False,batch_size=512,n_jobs=None):
+    '''
+    Returns the nodes within a given number of steps around every seed, for many seeds in one traversal.
+    The seeds are traversed together by a bit-parallel BFS (batch_size seeds at once),
+    so the edges are scanned once per level for the whole batch, not once for every seed.
+    The distances are unweighted hop counts.
+    
+    Parameters
+    ----------
+    G : networkx object or CSRGraph
+
+    seeds : list of node names in the centrals
+
+    cutoff : distance from the central nodes, an int, None (no limit) or a list with a cutoff for every seed.
+
+    direction: None or string
+        
+            The default is undirected.
+
+            If direction = in : We use the number of incoming degrees, as degree.
+
+            If direction = out : We use the number of outgoing degrees, as degree.
+    
+    as_subgraphs : bool, if True the subgraphs of the seeds are returned,
+                   as networkx subgraph views of G (not copies), or new induced graphs for a CSRGraph.
+    
+    batch_size : number of seeds traversed together.
+
+    n_jobs : None or int, number of worker processes. None or 1 is serial, -1 uses every CPU.
+             The batches are split between the workers, the adjacency is sent once to every worker.
+
+    Returns:
+    ------
+    nodes, memberships : the list of node names of G and a list of numpy arrays,
+                         the indices (in nodes) of the nodes around every seed, with the seed.
+    
+    or if as_subgraphs is True:
+    
+    graphs : a list of subgraphs, one for every seed.
+    '''
+    nodes,out_indptr,out_indices = csr_adjacency(G,direction=direction)
+    if direction == None or not G.is_directed():
+        in_indptr,in_indices = out_indptr,out_indices
+    else:
+        nodes,in_indptr,in_indices = csr_adjacency(G,direction=_opposite(direction))
+    
+    index = G.index if isinstance(G,CSRGraph) else {n:i for i,n in enumerate(nodes)}
+    sources = np.array([index[n] for n in seeds],dtype=np.int64)
+    
+    state = ((out_indptr,out_indices),(in_indptr,in_indices),batch_size)
+    chunks = split_items(np.arange(len(sources)),n_jobs,multiple=batch_size)
+    if np.ndim(cutoff) == 0:
+        items = [(sources[chunk],cutoff) for chunk in chunks]
+    else:
+        cutoff = np.asarray(cutoff)
+        items = [(sources[chunk],cutoff[chunk]) for chunk in chunks]
+    
+    memberships = list(itertools.chain.from_iterable(map_with_shared_state(_ego_memberships,items,state,n_jobs=n_jobs,
+                                                                           progress='seed chunks')))
+    
+    if as_subgraphs:
+        return [G.subgraph([nodes[i] for i in member.tolist()]) for member in memberships]
+    return nodes,memberships
+
+
+def _ego_memberships(state,item):
+    out_csr,in_csr,batch_size = state
+    sources,cutoff = item
+    
+    memberships = []
+    for batch_sources,visited in multi_source_bfs(out_csr,in_csr,sources,cutoff=cutoff,batch_size=batch_size):
+        positions,node_ids = visited_pairs(visited,len(batch_sources))
+        memberships.extend(np.split(node_ids,np.searchsorted(positions,np.arange(1,len(batch_sources)))))
+    return memberships
+
+
+def hop_profiles(G,seeds,cutoff=1,direction=None,counts=False,batch_size=512):
+    '''
+    Returns the rings around every seed: the nodes at exactly 0, 1, ..., cutoff steps,
+    from one level-synchronous traversal (bit-parallel, batch_size seeds at once),
+    instead of one neighbors_at_n_step call for every distance and seed.
+    The distances are unweighted hop counts.
+    
+    Parameters
+    ----------
+    G : networkx object or CSRGraph
+
+    seeds : list of node names in the centrals
+
+    cutoff : the largest distance, an int, or None (until no new node is reached).
+
+    direction: None or string
+        
+            The default is undirected.
+
+            If direction = in : We use the number of incoming degrees, as degree.
 
+            If direction = out : We use the number of outgoing degrees, as degree.
+    
+    counts : bool, if True only the sizes of the rings are returned.
+    
+    batch_size : number of seeds traversed together.
+
+    Returns:
+    ------
+    nodes, rings : the list of node names of G and a list for every seed, the k-th element of which is
+                   the numpy array of the indices (in nodes) of the nodes at exactly k steps from the seed.
+                   With an int cutoff every list has cutoff+1 arrays (the empty rings too),
+                   without cutoff the lists end at the last nonempty ring.
+    
+    or if counts is True:
+    
+    sizes : numpy int64 array, the row of a seed has the number of nodes at 0, 1, ... steps.
+    '''
+    nodes,out_indptr,out_indices = csr_adjacency(G,direction=direction)
+    if direction == None or not G.is_directed():
+        in_indptr,in_indices = out_indptr,out_indices
+    else:
+        nodes,in_indptr,in_indices = csr_adjacency(G,direction=_opposite(direction))
+    
+    index = G.index if isinstance(G,CSRGraph) else {n:i for i,n in enumerate(nodes)}
+    sources = np.array([index[n] for n in seeds],dtype=np.int64)
+    nr_levels = 0 if cutoff is None else cutoff+1
+    
+    sizes = [] # (position of the first seed of the batch, level, counts)
+    rings = [[] for _ in seeds]
+    start,nr_batch = 0,0
+    for batch_sources,level,ring in multi_source_bfs_levels((out_indptr,out_indices),(in_indptr,in_indices),sources,
+                                                             cutoff=cutoff,batch_size=batch_size):
+        if level == 0: # a new batch
+            start += nr_batch
+            nr_batch = len(batch_sources)
+        nr_levels = max(nr_levels,level+1)
+        
+        if counts:
+            sizes.append((start,level,_bit_counts(ring,nr_batch)))
+        else:
+            positions,node_ids = visited_pairs(ring,nr_batch)
+            for i,member in enumerate(np.split(node_ids,np.searchsorted(positions,np.arange(1,nr_batch)))):
+                rings[start+i].append(member)
+    
+    if counts:
+        result = np.zeros((len(sources),nr_levels),dtype=np.int64)
+        for first,level,count in sizes:
+            result[first:first+len(count),level] = count
+        return result
+    
+    empty = np.zeros(0,dtype=np.int64)
+    for seed_rings in rings:
+        if cutoff is None:
+            while len(seed_rings) > 1 and len(seed_rings[-1]) == 0:
+                seed_rings.pop()
+        else:
+            seed_rings.extend(empty for _ in range(nr_levels-len(seed_rings)))
+    return nodes,rings
 
 
 def neighbors_first_order(G,basenode,direction = None):
@@ -236,7 +605,7 @@ def neighbors_first_order(G,basenode,direction = None):
     
     Parameters:
     ----------
-    G : networkx object 
+    G : networkx object or CSRGraph
 
     basenode : name of a node in the graph
 
@@ -260,41 +629,153 @@ def neighbors_first_order(G,basenode,direction = None):
         print('Graph must be directed.')
         return []
 
-    #copy:
-    G = G.copy()
-    
-    # remove out edges of basenode
-    G.remove_edges_from(list(G.edges(basenode)))
-    
-    
-    star_nodes = neighbors_within_n_step(G,
-                                         node=basenode,
-                                         cutoff=np.infty,
-                                         direction=direction)
-    
+    return _first_order_star(_first_order_adjacency(G),basenode,direction)
+
+
+def _first_order_adjacency(G):
+    '''
+    Adjacency lists of G for neighbors_first_order, in the order of G.edges().
+    It's built once and shared by every basenode.
+    '''
+    nodes,src,dst = edge_arrays(G)
+    index = G.index if isinstance(G,CSRGraph) else {n:i for i,n in enumerate(nodes)}
+    src = src.tolist()
+    dst = dst.tolist()
+
+    succ = [dict() for _ in nodes]
+    pred = [dict() for _ in nodes]
+    for u,v in zip(src,dst):
+        succ[u][v] = None
+        pred[v][u] = None
+    succ = [list(nbrs) for nbrs in succ]
+    pred = [list(nbrs) for nbrs in pred]
+
+    return {'nodes':nodes,'index':index,'src':src,'dst':dst,
+            'succ':succ,'pred':pred,'acyclic':_is_acyclic(succ)}
+
+
+def _first_order_star(adjacency,basenode,direction=None):
+    '''
+    neighbors_first_order on the output of _first_order_adjacency.
+    '''
+    nodes = adjacency['nodes']
+    base = adjacency['index'][basenode]
+
+    # remove out edges of basenode:
+    succ = list(adjacency['succ'])
+    pred = list(adjacency['pred'])
+    for n in succ[base]:
+        pred[n] = [p for p in pred[n] if p != base]
+    succ[base] = []
+
+    if direction == None:
+        steps = [dict() for _ in nodes]
+        for u,v in zip(adjacency['src'],adjacency['dst']):
+            if u != base:
+                steps[u][v] = None
+                steps[v][u] = None
+        steps = [list(nbrs) for nbrs in steps]
+    elif direction == 'in':
+        steps = pred
+    elif direction == 'out':
+        steps = succ
+    else:
+        print('Direction format is not correct.')
+        return []
+
+    isolated = [False]*len(nodes)
+    star_order = _first_order_bfs(base,steps,isolated)
+
+    # nodes, which can reach basenode:
+    reach = [False]*len(nodes)
+    ancestors = _first_order_bfs(base,pred,isolated)
+    for i in ancestors:
+        reach[i] = True
+
+    if adjacency['acyclic']:
+        # number of out neighbors, which can reach basenode:
+        support = {i:sum(reach[n] for n in succ[i]) for i in ancestors}
+    else:
+        support = None
+
     # filter out: nodes with neighbor, that can't reach basenode, only through out edges:
-    nodes_reach_basenode = list(nx.single_target_shortest_path(G,basenode,cutoff=None).keys())
-    
-    for node in star_nodes:
-        
-        neighs = list(G.neighbors(node))#by out edges
-        
-        for n in neighs:
-            # if basenode can't be reached from node's outneighbors
-            if n not in nodes_reach_basenode:
-                #remove edges of node:
-                G.remove_edges_from(list(G.out_edges(node)))
-                G.remove_edges_from(list(G.in_edges(node)))
-        #update reachable nodes
-        nodes_reach_basenode = list(nx.single_target_shortest_path(G,basenode,cutoff=None).keys())
-    
+    for node in star_order:
+        if not any(not reach[n] and not isolated[n] for n in succ[node]):
+            continue
+        # remove edges of node:
+        isolated[node] = True
+        if reach[node]:
+            reach[node] = False
+            if support is None:
+                _recheck_reach(node,succ,pred,reach,isolated)
+            else:
+                queue = [node]
+                while queue:
+                    for p in pred[queue.pop()]:
+                        if reach[p]:
+                            support[p] -= 1
+                            if support[p] == 0 and p != base:
+                                reach[p] = False
+                                queue.append(p)
+
     # only valid nodes remained:
-    star_nodes = neighbors_within_n_step(G,
-                                         node=basenode,
-                                         cutoff=np.infty,
-                                         direction=direction)
-    
-    return star_nodes
+    return [nodes[i] for i in _first_order_bfs(base,steps,isolated)]
+
+
+def _first_order_bfs(source,steps,isolated):
+    '''
+    Returns the node indices reachable from source in breadth first order,
+    skipping the isolated nodes.
+    '''
+    seen = [False]*len(steps)
+    seen[source] = True
+    order = [source]
+    for node in order:
+        for n in steps[node]:
+            if not seen[n] and not isolated[n]:
+                seen[n] = True
+                order.append(n)
+    return order
+
+
+def _is_acyclic(succ):
+    '''
+    Kahn's algorithm on adjacency lists.
+    '''
+    in_degree = [0]*len(succ)
+    for nbrs in succ:
+        for n in nbrs:
+            in_degree[n] += 1
+    queue = [i for i,d in enumerate(in_degree) if d == 0]
+    for node in queue:
+        for n in succ[node]:
+            in_degree[n] -= 1
+            if in_degree[n] == 0:
+                queue.append(n)
+    return len(queue) == len(succ)
+
+
+def _recheck_reach(node,succ,pred,reach,isolated):
+    '''
+    Updates reach after node lost it: only the nodes reaching node are rechecked,
+    they keep reach if they can still get to a node, which was not affected.
+    '''
+    affected = [node]
+    for x in affected:
+        for p in pred[x]:
+            if reach[p]:
+                reach[p] = False
+                affected.append(p)
+
+    queue = [x for x in affected[1:]
+             if any(reach[n] and not isolated[n] for n in succ[x])]
+    for x in queue:
+        reach[x] = True
+    for x in queue:
+        for p in pred[x]:
+            if not reach[p] and not isolated[p] and p != node:
+                reach[p] = True
+                queue.append(p)
 
 
 def nr_components_linked_by_element(G,element, components):
@@ -303,7 +784,7 @@ def nr_components_linked_by_element(G,element, components):
     
     Parameters:
     ----------
-    G : networkx object 
+    G : networkx object or CSRGraph
     
     element : node of G
 
@@ -314,7 +795,7 @@ def nr_components_linked_by_element(G,element, components):
     occurrence : the number components, that have nodes with incoming edges from  the element node
     '''
     occurrence = 0
-    cited_nodes = list(nx.neighbors(G,element))
+    cited_nodes = list(G.neighbors(element))
     
     
     for c in components:
@@ -328,18 +809,28 @@ def nr_components_linked_by_element(G,element, components):
     return occurrence
 
 
-def env_of_nodes_first_order(G,basic_nodes):
+def _first_order_component(adjacency,basenode):
+    return _first_order_star(adjacency,basenode,direction='in')
+
+
+def env_of_nodes_first_order(G,basic_nodes,n_jobs=None,chunksize=16):
     '''
     Returns the first order components of the basic_nodes, and the binding nodes between them.
     
-    It uses the nr_components_linked_by_element function.
+    A node is binding, if its out neighbors are in at least two components, like in
+    nr_components_linked_by_element, but it's counted in one pass over the edges.
 
     Parameters:
     ----------
-    G : networkx object 
+    G : networkx object or CSRGraph
 
     basic_nodes : list of node names
 
+    n_jobs : None or int, number of worker processes for the components of the basic nodes.
+             None or 1 is serial, -1 uses every CPU. The graph is sent once to every worker.
+
+    chunksize : number of basic nodes sent to a worker at once.
+
     Returns:
     ------
     component_nodes : list of nodes in a component, around a basic_nodes, arranged in a list which follows the order of basic_nodes
@@ -347,28 +838,45 @@ def env_of_nodes_first_order(G,basic_nodes):
     binding_nodes: the nodes that connects the components.
     '''
 
+    if not G.is_directed():
+        print('Graph must be directed.')
+        return [[] for n in basic_nodes],[]
 
+    monitor = current_monitor()
+    with monitor.phase('graph copy'):
+        adjacency = _first_order_adjacency(G)
 
-    G = G.copy()
-    
-    binding_nodes = []
-    component_nodes = []
-    
     #iterate:
-    for n in basic_nodes:
-        c = neighbors_first_order(G=G,basenode=n,direction='in')
-        component_nodes.append(c)
-    
-    # binding nodes:
-    for n in G.nodes():
-        occur = nr_components_linked_by_element(G=G,element=n,components=component_nodes)
-        if occur >=2:
-            binding_nodes.append(n)
-    
-#     #add basic node back its component NEM KELL:
-#     for i in range(len(basic_nodes)):
-#         component_nodes[i].append(basic_nodes[i])
-    
+    with monitor.phase('traversal'):
+        component_nodes = list(map_with_shared_state(_first_order_component,basic_nodes,adjacency,
+                                                     n_jobs=n_jobs,chunksize=chunksize,progress='basic nodes'))
+
+    with monitor.phase('aggregation'):
+        # binding nodes:
+        index = adjacency['index']
+        nr_nodes = len(adjacency['nodes'])
+
+        # node -> component index, the components may overlap:
+        member_nodes = np.fromiter((index[n] for c in component_nodes for n in c),dtype=np.int64)
+        member_comps = np.repeat(np.arange(len(component_nodes),dtype=np.int64),
+                                 [len(c) for c in component_nodes])
+        order = np.argsort(member_nodes,kind='stable')
+        member_comps = member_comps[order]
+        counts = np.bincount(member_nodes,minlength=nr_nodes)
+        starts = np.concatenate(([0],np.cumsum(counts)[:-1]))
+
+        src = np.asarray(adjacency['src'],dtype=np.int64)
+        dst = np.asarray(adjacency['dst'],dtype=np.int64)
+
+        # every (element, component of a cited node) pair, in one pass over the edges:
+        nr_comps = max(len(component_nodes),1)
+        reps = counts[dst]
+        offsets = np.repeat(starts[dst]-np.cumsum(reps)+reps,reps)+np.arange(reps.sum())
+        keys = np.unique(np.repeat(src,reps)*nr_comps+member_comps[offsets])
+        occur = np.bincount(keys//nr_comps,minlength=nr_nodes)
+
+        binding_nodes = [adjacency['nodes'][i] for i in np.flatnonzero(occur >= 2)]
+
     return component_nodes,binding_nodes
 
 
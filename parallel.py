@@ -0,0 +1,105 @@
+'''
+Helpers to run a function on many items in a process pool.
+The state (graph, arrays) that every item needs is sent once per worker with
+the pool initializer, instead of pickling it for every task.
+'''
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import instrumentation
+from instrumentation import current_monitor, _NULL_MONITOR
+
+_shared_state = None
+
+
+def _init_worker(state):
+    global _shared_state
+    _shared_state = state
+    instrumentation._current = _NULL_MONITOR # a forked worker would report to the callback of the parent
+
+
+def _call_with_state(func,item):
+    return func(_shared_state,item)
+
+
+def nr_of_workers(n_jobs):
+    '''
+    Number of worker processes for n_jobs.
+    None or 1 means serial run, negative values count back from the number of CPUs (-1: all of them).
+    '''
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1,(os.cpu_count() or 1)+1+n_jobs)
+    return max(1,n_jobs)
+
+
+def map_with_shared_state(func,items,state,n_jobs=None,chunksize=1,min_items=2,progress=None):
+    '''
+    Yields func(state,item) for every item, in the order of items.
+    
+    Parameters:
+    ----------
+    func : function of (state,item), it must be picklable (defined on module level).
+    
+    items : list of the inputs.
+    
+    state : the shared input of every call, it's sent once to every worker.
+    
+    n_jobs : None or int, number of worker processes, see nr_of_workers.
+    
+    chunksize : number of items sent to a worker at once.
+    
+    min_items : with less items the function runs serially, the pool isn't worth to start.
+    
+    progress : None or the task name of the progress events (see instrumentation), sent after every item.
+    
+    Returns:
+    -------
+    generator of the results.
+    '''
+    workers = min(nr_of_workers(n_jobs),len(items))
+    monitor = current_monitor() if progress is not None and len(items) > 1 else _NULL_MONITOR
+    
+    if workers <= 1 or len(items) < min_items:
+        for i,item in enumerate(items):
+            yield func(state,item)
+            monitor.progress(progress,i+1,len(items))
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers,initializer=_init_worker,initargs=(state,)) as executor:
+        for i,result in enumerate(executor.map(partial(_call_with_state,func),items,chunksize=chunksize)):
+            yield result
+            monitor.progress(progress,i+1,len(items))
+
+
+def split_items(items,n_jobs=None,multiple=1,min_size=1,chunks_per_worker=4):
+    '''
+    Splits items into consecutive chunks for map_with_shared_state, so a task is a chunk, not a single item.
+    With one worker, or with few items, the result is one chunk and the map runs serially.
+    
+    Parameters:
+    ----------
+    items : list or numpy array.
+    
+    n_jobs : None or int, number of worker processes, see nr_of_workers.
+    
+    multiple : the chunk size is a multiple of it (e.g. the batch size of a bit-parallel BFS).
+    
+    min_size : minimal chunk size.
+    
+    chunks_per_worker : number of chunks per worker, for balancing uneven chunks.
+    
+    Returns:
+    -------
+    chunks : list of slices of items.
+    '''
+    workers = nr_of_workers(n_jobs)
+    if workers <= 1 or len(items) <= max(multiple,min_size):
+        return [items]
+    
+    size = max(min_size,-(-len(items)//(workers*chunks_per_worker)))
+    size = -(-size//multiple)*multiple
+    
+    return [items[i:i+size] for i in range(0,len(items),size)]
@@ -0,0 +1,258 @@
+'''
+Memoisation of the graph measures, keyed by a fingerprint of the graph.
+
+The same analysis of an unchanged graph snapshot (e.g. m_reaching_centrality, degree_dist, degree_correlation)
+is computed once: the result is kept in memory and, if a directory is given, on disk,
+so other processes and later sessions get it back without recomputing it.
+
+Example:
+-------
+cache = ResultCache('~/.cache/network_science',max_bytes=2**30)
+LRC_s = cache.call(hry.m_reaching_centrality,G,m=2,direction='in')
+dist = cache.call(dd.degree_dist,G,direction='out')
+'''
+import copy
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+
+from csr_graph import CSRGraph, edge_arrays
+
+
+def graph_fingerprint(graph,chunk_size=1000000):
+    '''
+    Hash of the graph structure: the node names in their order, the sorted edge array
+    and the directed/multigraph flags. Node, edge and graph attributes are not part of it.
+    The sorted edges are hashed chunk by chunk, so no serialised copy of the graph is made.
+    A CSRGraph is immutable, its fingerprint is computed only once.
+
+    Parameters:
+    ----------
+    graph: networkx object or CSRGraph
+
+    chunk_size : number of edges hashed at once.
+
+    Returns:
+    -------
+    fingerprint : hex string.
+    '''
+    if isinstance(graph,CSRGraph) and graph._fingerprint is not None:
+        return graph._fingerprint
+
+    nodes,src,dst = edge_arrays(graph)
+    src,dst = src.astype(np.int64,copy=False),dst.astype(np.int64,copy=False) # the keys can overflow int32
+    directed = graph.is_directed()
+    if not directed:
+        src,dst = np.minimum(src,dst),np.maximum(src,dst)
+    keys = np.sort(src*max(len(nodes),1)+dst)
+
+    h = hashlib.blake2b(digest_size=20)
+    h.update(repr((directed,graph.is_multigraph(),len(nodes),len(keys))).encode())
+    for start in range(0,len(nodes),chunk_size):
+        h.update('\x00'.join(map(repr,nodes[start:start+chunk_size])).encode())
+    h.update(b'\x01')
+    for start in range(0,len(keys),chunk_size):
+        h.update(keys[start:start+chunk_size].astype('<i8').tobytes())
+    fingerprint = h.hexdigest()
+
+    if isinstance(graph,CSRGraph):
+        graph._fingerprint = fingerprint
+    return fingerprint
+
+
+def _hash_value(h,value):
+    '''
+    Feeds a canonical representation of value into the hash h: numpy arrays by dtype, shape and bytes
+    (their repr is abbreviated), containers element by element, functions by module and name.
+    Objects without a stable representation (e.g. their repr has a memory address) raise TypeError.
+    '''
+    if value is None or isinstance(value,(bool,int,float,complex,str,bytes)):
+        h.update(('%s:%r;'%(type(value).__name__,value)).encode())
+    elif isinstance(value,(np.ndarray,np.generic)):
+        array = np.asarray(value)
+        if array.dtype.hasobject:
+            h.update(('object array %r;'%(array.shape,)).encode())
+            _hash_value(h,array.ravel().tolist())
+        else:
+            h.update(('array %s %r;'%(array.dtype.str,array.shape)).encode())
+            h.update(np.ascontiguousarray(array).tobytes())
+    elif isinstance(value,(list,tuple)):
+        h.update(('%s %d[;'%(type(value).__name__,len(value))).encode())
+        for item in value:
+            _hash_value(h,item)
+        h.update(b'];')
+    elif isinstance(value,(dict,set,frozenset)):
+        # the order of the items doesn't matter:
+        items = value.items() if isinstance(value,dict) else ((item,None) for item in value)
+        digests = []
+        for k,v in items:
+            item_hash = hashlib.blake2b(digest_size=20)
+            _hash_value(item_hash,k)
+            _hash_value(item_hash,v)
+            digests.append(item_hash.digest())
+        h.update(('%s %d{;'%(type(value).__name__,len(digests))).encode())
+        for digest in sorted(digests):
+            h.update(digest)
+        h.update(b'};')
+    elif isinstance(value,functools.partial):
+        h.update(b'partial;')
+        _hash_value(h,(value.func,value.args,value.keywords))
+    elif isinstance(value,CSRGraph) or isinstance(value,nx.Graph):
+        h.update(('graph %s;'%graph_fingerprint(value)).encode())
+    elif callable(value) and hasattr(value,'__module__') and hasattr(value,'__qualname__'):
+        name = '%s.%s'%(value.__module__,value.__qualname__)
+        if '<' in name: # lambda or local function, the name doesn't identify it
+            raise TypeError('%s has no stable representation for the cache key.'%name)
+        h.update(('function %s;'%name).encode())
+    else:
+        raise TypeError('%s has no stable representation for the cache key.'%type(value).__name__)
+
+
+class ResultCache:
+    '''
+    Results of functions of a graph, keyed by (function, graph fingerprint, parameters).
+    The recently used results are kept in memory, all of them on disk (if directory is given)
+    until the size of the stored files exceeds max_bytes, then the least recently used files are deleted.
+    The results must be picklable. Several processes can share the directory.
+
+    Parameters:
+    ----------
+    directory : None or path of the on-disk store, None keeps the results only in memory.
+
+    max_bytes : size limit of the on-disk store.
+
+    max_memory_items : number of results kept in memory.
+
+    ignore : names of parameters, that don't change the result (e.g. n_jobs), they are not part of the key.
+             batch_size is part of the key, because the swaps of the randomisation depend on it.
+    '''
+    def __init__(self,directory=None,max_bytes=2**30,max_memory_items=64,ignore=('n_jobs','chunksize')):
+        self.directory = None if directory is None else os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.max_memory_items = max_memory_items
+        self.ignore = set(ignore)
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.directory is not None:
+            os.makedirs(self.directory,exist_ok=True)
+
+    def key(self,func,graph,*args,**kwargs):
+        '''
+        The key of func(graph,*args,**kwargs): the defaults are filled in,
+        so the same call with or without the default parameters gives the same key.
+        The parameters are hashed by their content (see _hash_value), TypeError is raised
+        for a parameter without a stable representation.
+        '''
+        bound = inspect.signature(func).bind(graph,*args,**kwargs)
+        bound.apply_defaults()
+        params = [(name,value) for name,value in list(bound.arguments.items())[1:] if name not in self.ignore]
+
+        h = hashlib.blake2b(digest_size=20)
+        _hash_value(h,func)
+        h.update(graph_fingerprint(graph).encode())
+        _hash_value(h,params)
+        return h.hexdigest()
+
+    def _path(self,key):
+        return os.path.join(self.directory,key+'.pkl')
+
+    def get(self,key,default=None):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.directory is None:
+            return default
+
+        path = self._path(key)
+        try:
+            with open(path,'rb') as f:
+                result = pickle.load(f)
+            os.utime(path) # the modification time is the time of the last use
+        except (OSError,EOFError,pickle.UnpicklingError):
+            return default
+
+        self._remember(key,result)
+        return result
+
+    def put(self,key,result):
+        self._remember(key,result)
+        if self.directory is None:
+            return
+
+        # written to a temporary file first, so an other process never reads a half written file:
+        fd,tmp_path = tempfile.mkstemp(dir=self.directory,suffix='.tmp')
+        with os.fdopen(fd,'wb') as f:
+            pickle.dump(result,f,protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path,self._path(key))
+        self._evict()
+
+    def _remember(self,key,result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        '''
+        Deletes the least recently used files, until the store fits into max_bytes.
+        '''
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime,stat.st_size,entry.path))
+
+        total = sum(size for _,size,_ in files)
+        for _,size,path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def call(self,func,graph,*args,**kwargs):
+        '''
+        Returns func(graph,*args,**kwargs), from the cache if it was computed before on the same graph.
+        The result is a copy, changing it doesn't change the cached result.
+        A call with a parameter, that has no stable representation, is computed and not cached.
+        '''
+        try:
+            key = self.key(func,graph,*args,**kwargs)
+        except TypeError:
+            # a parameter can't be hashed reliably, so the result is not cached:
+            self.misses += 1
+            return func(graph,*args,**kwargs)
+
+        missing = object()
+        result = self.get(key,missing)
+        if result is not missing:
+            self.hits += 1
+            return copy.deepcopy(result)
+
+        self.misses += 1
+        result = func(graph,*args,**kwargs)
+        self.put(key,copy.deepcopy(result))
+        return result
+
+    def clear(self):
+        '''
+        Deletes every result, from memory and from the disk.
+        '''
+        self._memory.clear()
+        if self.directory is not None:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pkl'):
+                    os.remove(entry.path)
@@ -0,0 +1,102 @@
+'''
+The vectorised degree distributions must give the results of the original loops.
+'''
+import math
+import os
+import sys
+from collections import Counter
+
+import networkx as nx
+import numpy as np
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import degree_dist as dd
+from csr_graph import CSRGraph
+
+
+def _logbinned_reference(degrees,base):
+    '''
+    The original loop of degree_dist_logbinned.
+    '''
+    degdist = {k:c/len(degrees) for k,c in sorted(Counter(degrees).items())}
+    boundarys = [[base**(i-1),base**i] for i in range(1,int(math.log(max(degdist.keys()),base))+2)]
+    
+    k_vals_log = []
+    k_probs_log = []
+    for lo,hi in boundarys:
+        s = 0
+        tmp_degrees = []
+        for j in range(lo,hi):
+            if j in degdist:
+                s += degdist[j]
+                tmp_degrees.append(j)
+        k_vals_log.append(np.average(tmp_degrees) if tmp_degrees else np.nan)
+        k_probs_log.append(s/(hi-lo))
+    
+    return np.array(k_vals_log),np.array(k_probs_log)
+
+
+def _assert_logbinned(degrees,base):
+    k_vals,k_probs = dd.degree_dist_logbinned_from_degrees(np.array(degrees),base=base,as_dict=False)
+    ref_k_vals,ref_k_probs = _logbinned_reference(list(degrees),base)
+    np.testing.assert_array_equal(k_vals,ref_k_vals)
+    np.testing.assert_array_equal(k_probs,ref_k_probs)
+
+
+@pytest.mark.parametrize('degrees,base',[([1,5,10**6],10),([1,10,100,1000],10),([1,2,243],3),
+                                         ([0,1,2,4,8,16],2),([3,3,3],3),([1,1000],10)])
+def test_logbinned_exact_powers(degrees,base):
+    _assert_logbinned(degrees,base)
+
+
+@pytest.mark.parametrize('seed',range(20))
+def test_logbinned_random(seed):
+    rng = np.random.default_rng(seed)
+    base = int(rng.integers(2,5))
+    degrees = (rng.pareto(rng.uniform(1,3),size=int(rng.integers(1,2000)))*rng.integers(1,5)).astype(int)
+    degrees[0] = max(degrees[0],1)
+    _assert_logbinned(degrees.tolist(),base)
+
+
+def test_logbinned_of_graph_and_edgelist(tmp_path):
+    graph = nx.star_graph(1000)
+    result = dd.degree_dist_logbinned(graph,base=10,as_dict=False)
+    reference = _logbinned_reference([d for _,d in graph.degree()],10)
+    np.testing.assert_array_equal(result[0],reference[0])
+    np.testing.assert_array_equal(result[1],reference[1])
+    
+    path = tmp_path/'star.txt'
+    path.write_text(''.join('%d %d\n'%edge for edge in graph.edges()))
+    result = dd.edgelist_degree_dist(str(path),kind='logbinned',base=10,as_dict=False)
+    np.testing.assert_array_equal(result[0],reference[0])
+    np.testing.assert_array_equal(result[1],reference[1])
+
+
+def _correlation_graph(kind,seed):
+    graph = {'graph':nx.Graph,'digraph':nx.DiGraph,'multigraph':nx.MultiGraph,'multidigraph':nx.MultiDiGraph}[kind]()
+    edges = nx.gnm_random_graph(80,300,seed=seed,directed=kind.endswith('digraph')).edges()
+    graph.add_nodes_from(range(80))
+    graph.add_edges_from(edges)
+    if kind.startswith('multi'):
+        graph.add_edges_from(list(edges)[:40]) # parallel edges
+    return graph
+
+
+# the networkx method fails on a multidigraph without direction (its undirected copy keeps
+# the opposite edges as parallel edges), so there is nothing to compare with:
+CORRELATION_CASES = [('graph',None),('multigraph',None),('digraph',None),('digraph','in'),('digraph','out'),
+                     ('multidigraph','in'),('multidigraph','out')]
+
+
+@pytest.mark.parametrize('kind,direction',CORRELATION_CASES)
+@pytest.mark.parametrize('seed',range(3))
+def test_sparse_degree_correlation_matches_networkx(kind,direction,seed):
+    graph = _correlation_graph(kind,seed)
+    expected = dd.degree_correlation(graph,direction=direction,method='networkx')
+    
+    for result in [dd.degree_correlation(graph,direction=direction,method='sparse'),
+                   dd.degree_correlation(CSRGraph.from_networkx(graph),direction=direction)]:
+        assert list(result.keys()) == list(expected.keys())
+        assert list(result.values()) == pytest.approx(list(expected.values()))
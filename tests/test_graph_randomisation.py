@@ -0,0 +1,80 @@
+'''
+The degree preserving randomisation must keep the degree of every node.
+'''
+import os
+import sys
+
+import networkx as nx
+import numpy as np
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_randomisation as gr
+from csr_graph import CSRGraph
+
+
+def _degrees(graph):
+    if graph.is_directed():
+        return dict(graph.in_degree()),dict(graph.out_degree())
+    return dict(graph.degree())
+
+
+@pytest.mark.parametrize('seed',range(5))
+def test_undirected_degrees_are_preserved(seed):
+    graph = nx.gnm_random_graph(200,800,seed=seed)
+    randomised = gr.degree_preserving_randomisation_fast(graph,2000,seed=seed,batch_size=256)
+    
+    assert type(randomised) is nx.Graph
+    assert _degrees(randomised) == _degrees(graph)
+    assert randomised.number_of_edges() == graph.number_of_edges()
+    assert nx.number_of_selfloops(randomised) == 0
+    assert set(map(frozenset,randomised.edges())) != set(map(frozenset,graph.edges()))
+
+
+def test_seed_gives_the_same_randomisation():
+    graph = nx.gnm_random_graph(100,300,seed=1)
+    first = gr.degree_preserving_randomisation_fast(graph,500,seed=7,return_edges=True)[1]
+    second = gr.degree_preserving_randomisation_fast(graph,500,seed=7,return_edges=True)[1]
+    assert np.array_equal(first,second)
+
+
+def test_csr_graph_degrees_are_preserved():
+    graph = CSRGraph.from_networkx(nx.gnm_random_graph(200,800,seed=3))
+    randomised = gr.degree_preserving_randomisation_fast(graph,2000,seed=3)
+    
+    assert isinstance(randomised,CSRGraph)
+    assert np.array_equal(randomised.degrees(None),graph.degrees(None))
+
+
+@pytest.mark.parametrize('seed',range(5))
+def test_directed_degrees_are_preserved(seed):
+    graph = nx.gnm_random_graph(200,800,seed=seed,directed=True)
+    randomised = gr.degree_preserving_randomisation_fast(graph,2000,seed=seed,batch_size=256)
+    
+    assert type(randomised) is nx.DiGraph
+    assert _degrees(randomised) == _degrees(graph)
+    assert randomised.number_of_edges() == graph.number_of_edges()
+
+
+@pytest.mark.parametrize('directed',[False,True])
+def test_multigraph_degrees_are_preserved(directed):
+    graph = nx.MultiDiGraph() if directed else nx.MultiGraph()
+    edges = nx.gnm_random_graph(100,400,seed=2,directed=directed).edges()
+    graph.add_edges_from(edges)
+    graph.add_edges_from(list(edges)[:50]) # parallel edges
+    randomised = gr.degree_preserving_randomisation_fast(graph,1000,seed=2,multi_edges=True,self_loops=True)
+    
+    assert type(randomised) is type(graph)
+    assert _degrees(randomised) == _degrees(graph)
+    assert randomised.number_of_edges() == graph.number_of_edges()
+
+
+@pytest.mark.parametrize('directed',[False,True])
+def test_multi_edges_of_simple_graph_give_multigraph(directed):
+    graph = nx.gnm_random_graph(100,800,seed=1,directed=directed)
+    randomised = gr.degree_preserving_randomisation_fast(graph,5000,seed=2,multi_edges=True)
+    
+    assert randomised.is_multigraph() and randomised.is_directed() == directed
+    assert _degrees(randomised) == _degrees(graph)
+    assert randomised.number_of_edges() == graph.number_of_edges()
@@ -0,0 +1,64 @@
+'''
+The levels of hierarchy_lvls_sweep must be the levels of hierarchy_lvls_of_node_LRCs.
+'''
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hierarchy as hry
+
+
+COEFS = [0.1,0.3,0.6,1.0]
+
+
+def _random_LRCs(seed,nr_nodes=60):
+    rng = np.random.default_rng(seed)
+    values = rng.exponential(size=nr_nodes)
+    if seed % 2:
+        values = np.round(values,1) # equal values
+    return {'n%d'%i:float(v) for i,v in enumerate(values)}
+
+
+@pytest.mark.parametrize('seed',range(50))
+def test_sweep_matches_direct_levels(seed):
+    node_LRCs = _random_LRCs(seed)
+    sweep = hry.hierarchy_lvls_sweep(node_LRCs,COEFS)
+    
+    for coef in COEFS:
+        lvl_names,lvl_LRC_s = hry.lvls_of_sweep(sweep,coef)
+        direct_names,direct_LRC_s = hry.hierarchy_lvls_of_node_LRCs(node_LRCs,coef)
+        assert [list(names) for names in lvl_names] == [list(names) for names in direct_names]
+        assert lvl_LRC_s == direct_LRC_s
+
+
+@pytest.mark.parametrize('seed',range(10))
+def test_sweep_levels_dont_depend_on_other_coefs(seed):
+    node_LRCs = _random_LRCs(seed)
+    alone = hry.lvls_of_sweep(hry.hierarchy_lvls_sweep(node_LRCs,[0.1,1.0]),0.1)
+    among = hry.lvls_of_sweep(hry.hierarchy_lvls_sweep(node_LRCs,[0.1,0.3,1.0]),0.1)
+    assert alone == among
+
+
+@pytest.mark.parametrize('seed',range(10))
+def test_sweep_parents_overlap(seed):
+    sweep = hry.hierarchy_lvls_sweep(_random_LRCs(seed),COEFS)
+    coefs = sweep['STD_coefs']
+    assert all(parent is None for parent in sweep['levels'][coefs[0]]['parents'])
+    
+    for larger,smaller in zip(coefs,coefs[1:]):
+        parent_boundaries = sweep['levels'][larger]['boundaries']
+        for (start,end),parents in zip(sweep['levels'][smaller]['boundaries'],sweep['levels'][smaller]['parents']):
+            overlapping = [i for i,(s,e) in enumerate(parent_boundaries) if s < end and start < e]
+            assert parents == overlapping
+
+
+def test_sweep_straddling_level():
+    node_LRCs = {0:10,1:0,2:0,3:0,4:0,5:0,6:9,7:9}
+    sweep = hry.hierarchy_lvls_sweep(node_LRCs,[1.0,0.6])
+    assert sweep['levels'][1.0]['boundaries'] == [(0,4),(4,8)]
+    assert sweep['levels'][0.6]['boundaries'] == [(0,3),(3,8)]
+    assert sweep['levels'][0.6]['parents'] == [[0],[0,1]]
@@ -0,0 +1,98 @@
+'''
+The rewritten first order neighbourhoods must give the results of the original implementation,
+in the same order.
+'''
+import os
+import sys
+
+import networkx as nx
+import numpy as np
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import neighborhood as nb
+from csr_graph import CSRGraph
+
+
+def _neighbors_within_n_step_reference(G,node,cutoff=1,direction=None):
+    if direction == None:
+        G = G.copy().to_undirected()
+    elif direction == 'in':
+        G = G.copy().reverse()
+    path_lengths = nx.single_source_dijkstra_path_length(G,source=node,cutoff=cutoff)
+    return [node for node,length in path_lengths.items()]
+
+
+def _neighbors_first_order_reference(G,basenode,direction=None):
+    '''
+    The original neighbors_first_order.
+    '''
+    G = G.copy()
+    G.remove_edges_from(list(G.edges(basenode)))
+    
+    star_nodes = _neighbors_within_n_step_reference(G,basenode,cutoff=np.inf,direction=direction)
+    nodes_reach_basenode = list(nx.single_target_shortest_path(G,basenode,cutoff=None).keys())
+    for node in star_nodes:
+        for n in list(G.neighbors(node)):
+            if n not in nodes_reach_basenode:
+                G.remove_edges_from(list(G.out_edges(node)))
+                G.remove_edges_from(list(G.in_edges(node)))
+        nodes_reach_basenode = list(nx.single_target_shortest_path(G,basenode,cutoff=None).keys())
+    
+    return _neighbors_within_n_step_reference(G,basenode,cutoff=np.inf,direction=direction)
+
+
+def _env_of_nodes_first_order_reference(G,basic_nodes):
+    '''
+    The original env_of_nodes_first_order.
+    '''
+    component_nodes = [_neighbors_first_order_reference(G,n,direction='in') for n in basic_nodes]
+    binding_nodes = []
+    for n in G.nodes():
+        cited_nodes = list(nx.neighbors(G,n))
+        if sum(any(neigh in c for neigh in cited_nodes) for c in component_nodes) >= 2:
+            binding_nodes.append(n)
+    
+    return component_nodes,binding_nodes
+
+
+def _random_digraph(seed):
+    '''
+    Cyclic and acyclic digraphs and multidigraphs, with shuffled node names.
+    '''
+    rng = np.random.default_rng(seed)
+    nr_nodes = int(rng.integers(5,25))
+    nr_edges = int(rng.integers(nr_nodes,3*nr_nodes))
+    edges = rng.integers(0,nr_nodes,size=(nr_edges,2))
+    if seed % 3 == 0: # acyclic: the edges point to the smaller node
+        edges = np.sort(edges,axis=1)[:,::-1]
+        edges = edges[edges[:,0] != edges[:,1]]
+    
+    graph = nx.MultiDiGraph() if seed % 5 == 0 else nx.DiGraph()
+    names = rng.permutation(nr_nodes).tolist()
+    graph.add_nodes_from(names)
+    graph.add_edges_from((names[u],names[v]) for u,v in edges.tolist())
+    return graph
+
+
+@pytest.mark.parametrize('seed',range(150))
+def test_neighbors_first_order(seed):
+    graph = _random_digraph(seed)
+    csr = CSRGraph.from_networkx(graph)
+    basenodes = list(graph.nodes())[:4]
+    
+    for direction in [None,'in','out']:
+        for basenode in basenodes:
+            expected = _neighbors_first_order_reference(graph,basenode,direction=direction)
+            assert nb.neighbors_first_order(graph,basenode,direction=direction) == expected
+            assert nb.neighbors_first_order(csr,basenode,direction=direction) == expected
+
+
+@pytest.mark.parametrize('seed',range(0,150,5))
+def test_env_of_nodes_first_order(seed):
+    graph = _random_digraph(seed)
+    basic_nodes = list(graph.nodes())[:3]
+    
+    expected = _env_of_nodes_first_order_reference(graph,basic_nodes)
+    assert nb.env_of_nodes_first_order(graph,basic_nodes) == expected
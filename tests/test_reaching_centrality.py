@@ -0,0 +1,46 @@
+'''
+The LRC backends of m_reaching_centrality must give the same values.
+'''
+import os
+import sys
+
+import networkx as nx
+import numpy as np
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hierarchy as hry
+from csr_graph import CSRGraph
+
+
+def _random_graph(kind,seed,nr_nodes=60,nr_edges=150):
+    rng = np.random.default_rng(seed)
+    graph = {'digraph':nx.DiGraph,'multidigraph':nx.MultiDiGraph,
+             'graph':nx.Graph,'multigraph':nx.MultiGraph}[kind]()
+    graph.add_nodes_from(range(nr_nodes))
+    edges = rng.integers(0,nr_nodes,size=(nr_edges,2))
+    if kind.startswith('multi'):
+        # parallel edges and self-loops:
+        edges = np.vstack((edges,edges[:20],[[0,0],[5,5]]))
+    graph.add_edges_from(edges.tolist())
+    return graph
+
+
+CASES = [(kind,direction) for kind in ['digraph','multidigraph'] for direction in [None,'in','out']]
+CASES += [('graph',None),('multigraph',None)]
+
+
+@pytest.mark.parametrize('kind,direction',CASES)
+@pytest.mark.parametrize('seed',[0,1,2])
+def test_backends_agree(kind,direction,seed):
+    graph = _random_graph(kind,seed)
+    
+    for m in [1,2,3,None]:
+        expected = hry.m_reaching_centrality(graph,m=m,direction=direction,method='bfs')
+        methods = ['bitset','auto'] + (['condensation'] if m == None else [])
+        for method in methods:
+            assert hry.m_reaching_centrality(graph,m=m,direction=direction,method=method,batch_size=64) == expected, method
+        
+        csr = CSRGraph.from_networkx(graph)
+        assert hry.m_reaching_centrality(csr,m=m,direction=direction,method='bitset') == expected